@@ -0,0 +1,107 @@
+"""Scaling benchmark over the small, default and large map variants of both envs.
+
+Plays random valid actions on every variant and reports, per window of steps, the building count, the time per step
+and per phase of step(), together with the map area and the bytes of one observation. The summary fits how step time
+grows with map area (as a log-log exponent, 1 is linear) and with the building count (ms per building), as JSON:
+
+    python benchmarks/bench_scaling.py --output scaling.json
+"""
+import argparse
+import json
+import platform
+import time
+
+import gym
+import numpy as np
+
+import gym_alphaexpansion  # noqa: F401, registers the envs
+from gym_alphaexpansion import masks
+from gym_alphaexpansion.profiling import PHASES
+
+FAMILIES = {
+    'AlphaExpansion': ('AlphaExpansionSmall-v0', 'AlphaExpansion-v0', 'AlphaExpansionLarge-v0'),
+    'AlphaExpansionRoad': ('AlphaExpansionRoadSmall-v0', 'AlphaExpansionRoad-v0', 'AlphaExpansionRoadLarge-v0'),
+}
+
+
+def observation_bytes(ob):
+    if isinstance(ob, dict):
+        return int(sum(np.asarray(plane).nbytes for plane in ob.values()))
+    return int(np.asarray(ob).nbytes)
+
+
+def bench_variant(env_id, seed, steps, window):
+    env = gym.make(env_id, render_mode=None, instrument=True).unwrapped
+    env.seed(seed)
+    ob = env.reset()
+    rng = np.random.RandomState(seed % 2 ** 32)
+    windows = []
+    for _ in range(steps // window):
+        env.profiler.reset()
+        start = time.perf_counter_ns()
+        done = False
+        for _ in range(window):
+            ob, _, done, _ = env.step(masks.sample_masked(env.action_space, env.action_mask(), rng))
+            if done:
+                break
+        elapsed = time.perf_counter_ns() - start
+        stats = env.stats()
+        windows.append({'buildings': stats['buildings'], 'steps': stats['steps'],
+                        'ms_per_step': elapsed / stats['steps'] / 1e6,
+                        'phase_ms_per_step': {phase: stats['phase_ns_total'][phase] / stats['steps'] / 1e6
+                                              for phase in PHASES}})
+        if done:
+            break
+    width, height = env.game.map.CHUNK_WIDTH, env.game.map.CHUNK_HEIGHT
+    env.close()
+    size = observation_bytes(ob)
+    return {'env': env_id, 'seed': seed, 'map_width': width, 'map_height': height, 'area': width * height,
+            'observation_bytes': size, 'observation_bytes_per_tile': size / (width * height), 'windows': windows}
+
+
+def summarize(family, results):
+    """ Area exponent of the first-window step time over the family's variants and ms per building of each variant."""
+    areas = np.asarray([result['area'] for result in results], dtype=np.float64)
+    first_ms = np.asarray([result['windows'][0]['ms_per_step'] for result in results])
+    summary = {'family': family,
+               'area_exponent': float(np.polyfit(np.log(areas), np.log(first_ms), 1)[0]),
+               'observation_bytes_area_exponent': float(np.polyfit(
+                   np.log(areas), np.log([result['observation_bytes'] for result in results]), 1)[0]),
+               'ms_per_building': {}}
+    for result in results:
+        buildings = [w['buildings'] for w in result['windows']]
+        if len(set(buildings)) > 1:
+            ms = [w['ms_per_step'] for w in result['windows']]
+            summary['ms_per_building'][result['env']] = float(np.polyfit(buildings, ms, 1)[0])
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--family', choices=sorted(FAMILIES), action='append',
+                        help='env family to benchmark, may be repeated (default: all)')
+    parser.add_argument('--seed', type=int, default=999999999999)
+    parser.add_argument('--steps', type=int, default=2000, help='steps played per variant')
+    parser.add_argument('--window', type=int, default=100, help='steps per measurement')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    summaries = []
+    for family in args.family or sorted(FAMILIES):
+        family_results = [bench_variant(env_id, args.seed, args.steps, args.window) for env_id in FAMILIES[family]]
+        results.extend(family_results)
+        summaries.append(summarize(family, family_results))
+
+    report = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+              'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'args': vars(args), 'summary': summaries,
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
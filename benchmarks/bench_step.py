@@ -0,0 +1,146 @@
+"""Step throughput benchmark for AlphaExpansion-v0 and AlphaExpansionRoad-v0.
+
+Measures reset() latency, steps/sec and the time spent in every phase of step() (action, tick, reward, observation,
+info) at several points of an episode, for single envs and the vectorized envs, and writes the results as JSON:
+
+    python benchmarks/bench_step.py --output bench.json
+"""
+import argparse
+import json
+import platform
+import time
+
+import gym
+import numpy as np
+
+import gym_alphaexpansion  # noqa: F401, registers the envs
+from gym_alphaexpansion import masks
+from gym_alphaexpansion.envs import alphaexpansion_env as ae
+from gym_alphaexpansion.envs import alphaexpansionroad_env as aer
+from gym_alphaexpansion.envs import AlphaExpansionVecEnv, SubprocVecEnv
+from gym_alphaexpansion.profiling import PHASES
+
+ENVS = {
+    'AlphaExpansion-v0': ae.AlphaExpansionEnv,
+    'AlphaExpansionRoad-v0': aer.AlphaExpansionRoadEnv,
+}
+
+# where the measured steps start, as a fraction of the rest of the episode, to reach the early, mid and late game
+STAGES = {'early': 0.0, 'mid': 0.4, 'late': 0.8}
+
+MAX_STEPS = {
+    'AlphaExpansion-v0': ae.MAX_STEPS,
+    'AlphaExpansionRoad-v0': aer.MAX_STEPS,
+}
+
+
+def episode_limit(env_id):
+    """ Steps before an episode ends, whichever of the registered time limit and the env's own limit comes first."""
+    return min(gym.spec(env_id).max_episode_steps or MAX_STEPS[env_id], MAX_STEPS[env_id])
+
+
+def stage_steps(env_id, steps):
+    """ Measured steps per stage run, at most a fifth of an episode so that the stages cover different parts of it."""
+    return min(steps, episode_limit(env_id) // 5)
+
+
+def stage_warmups(env_id, steps):
+    """ Warmup steps per stage, so that warmup plus the measured steps stay within one episode."""
+    room = episode_limit(env_id) - stage_steps(env_id, steps)
+    return {stage: int(fraction * room) for stage, fraction in STAGES.items()}
+
+
+def sample_action(env, rng):
+    """ Random valid action, so the map actually fills up with buildings."""
+    return masks.sample_masked(env.action_space, env.action_mask(), rng)
+
+
+def bench_reset(env_id, seed, resets):
+    env = ENVS[env_id](render_mode=None)
+    env.seed(seed)
+    latencies = []
+    for _ in range(resets):
+        start = time.perf_counter_ns()
+        env.reset()
+        latencies.append(time.perf_counter_ns() - start)
+    return {'env': env_id, 'mode': 'reset', 'seed': seed, 'resets': resets,
+            'mean_ms': float(np.mean(latencies)) / 1e6, 'min_ms': float(np.min(latencies)) / 1e6}
+
+
+def bench_single(env_id, stage, warmup, seed, steps):
+    env = ENVS[env_id](render_mode=None, instrument=True)
+    env.seed(seed)
+    env.reset()
+    rng = np.random.RandomState(seed % 2 ** 32)
+    env.action_space.seed(seed)
+    for _ in range(warmup):
+        env.step(sample_action(env, rng))
+    env.profiler.reset()
+    # only happens when an episode ends before its limit, the reset time is then part of the measurement
+    resets = 0
+    start = time.perf_counter_ns()
+    for _ in range(steps):
+        _, _, done, _ = env.step(sample_action(env, rng))
+        if done:
+            env.reset()
+            resets += 1
+    elapsed = time.perf_counter_ns() - start
+    stats = env.stats()
+    return {'env': env_id, 'mode': 'single', 'stage': stage, 'warmup_steps': warmup, 'seed': seed, 'steps': steps,
+            'episode_limit': episode_limit(env_id), 'resets': resets,
+            'buildings': stats['buildings'], 'useless_actions': stats['useless_actions'],
+            'steps_per_sec': steps / (elapsed / 1e9),
+            'phase_ms_per_step': {phase: stats['phase_ns_total'][phase] / steps / 1e6 for phase in PHASES}}
+
+
+def bench_vectorized(env_id, mode, num_envs, seed, steps):
+    if mode == 'lockstep':
+        envs = AlphaExpansionVecEnv(num_envs)
+    else:
+        envs = SubprocVecEnv(env_id, num_envs)
+    envs.seed(seed)
+    envs.reset()
+    envs.action_space.seed(seed)
+    start = time.perf_counter_ns()
+    for _ in range(steps):
+        envs.step([envs.action_space.sample() for _ in range(num_envs)])
+    elapsed = time.perf_counter_ns() - start
+    envs.close()
+    return {'env': env_id, 'mode': mode, 'num_envs': num_envs, 'seed': seed, 'steps': steps,
+            'steps_per_sec': num_envs * steps / (elapsed / 1e9)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--env', choices=sorted(ENVS), action='append',
+                        help='env to benchmark, may be repeated (default: all)')
+    parser.add_argument('--seed', type=int, default=999999999999)
+    parser.add_argument('--steps', type=int, default=500,
+                        help='measured steps per run, single env runs measure at most a fifth of an episode')
+    parser.add_argument('--resets', type=int, default=20)
+    parser.add_argument('--num-envs', type=int, default=16, help='envs per vectorized run, 0 skips them')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    for env_id in args.env or sorted(ENVS):
+        results.append(bench_reset(env_id, args.seed, args.resets))
+        steps = stage_steps(env_id, args.steps)
+        for stage, warmup in stage_warmups(env_id, args.steps).items():
+            results.append(bench_single(env_id, stage, warmup, args.seed, steps))
+        if args.num_envs:
+            if env_id == 'AlphaExpansion-v0':
+                results.append(bench_vectorized(env_id, 'lockstep', args.num_envs, args.seed, args.steps))
+            results.append(bench_vectorized(env_id, 'subprocess', args.num_envs, args.seed, args.steps))
+
+    report = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+              'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'args': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
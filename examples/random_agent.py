@@ -1,13 +1,16 @@
 import argparse
 import numpy as np
 import gym_alphaexpansion.envs.alphaexpansion_env as ae
+from gym_alphaexpansion import masks
 
 
 class RandomAgent(object):
     def __init__(self, action_space):
         self.action_space = action_space
 
-    def act(self):
+    def act(self, mask=None):
+        if mask is not None:
+            return masks.sample_masked(self.action_space, mask)
         return self.action_space.sample()
 
 
@@ -18,6 +21,7 @@ def running_mean(x):
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
+    parser.add_argument('--masked', action='store_true', help='only sample actions the game would accept')
     args = parser.parse_args()
 
     env = ae.AlphaExpansionEnv()
@@ -32,7 +36,7 @@ if __name__ == '__main__':
         steps = 0
         score = 0.0
         while not done:
-            action = agent.act()
+            action = agent.act(env.action_mask() if args.masked else None)
             obs, reward, done, info = env.step(action)
             score += reward
             steps += 1
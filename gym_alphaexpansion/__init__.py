@@ -12,3 +12,33 @@ register(
     entry_point='gym_alphaexpansion.envs.alphaexpansionroad_env:AlphaExpansionRoadEnv',
     max_episode_steps=500
 )
+
+# smaller and larger maps than the defaults above (7x7 with 4 forests and mountains, and main.Game's default map for
+# the road env), forests and mountains scale with the map area
+register(
+    id='AlphaExpansionSmall-v0',
+    entry_point='gym_alphaexpansion.envs.alphaexpansion_env:AlphaExpansionEnv',
+    max_episode_steps=5000,
+    kwargs={'height': 5, 'width': 5, 'min_forests': 2, 'min_mountains': 2}
+)
+
+register(
+    id='AlphaExpansionLarge-v0',
+    entry_point='gym_alphaexpansion.envs.alphaexpansion_env:AlphaExpansionEnv',
+    max_episode_steps=5000,
+    kwargs={'height': 14, 'width': 14, 'min_forests': 16, 'min_mountains': 16}
+)
+
+register(
+    id='AlphaExpansionRoadSmall-v0',
+    entry_point='gym_alphaexpansion.envs.alphaexpansionroad_env:AlphaExpansionRoadEnv',
+    max_episode_steps=500,
+    kwargs={'height': 8, 'width': 14}
+)
+
+register(
+    id='AlphaExpansionRoadLarge-v0',
+    entry_point='gym_alphaexpansion.envs.alphaexpansionroad_env:AlphaExpansionRoadEnv',
+    max_episode_steps=500,
+    kwargs={'height': 32, 'width': 56}
+)
@@ -0,0 +1,72 @@
+class RoadComponents(object):
+    """ Incremental disjoint-set over map tiles counting 4-connected groups of buildings.
+
+    Tiles are addressed as (y, x) like game.map.map. Adding a building is O(alpha(n)), removing one rebuilds the
+    structure from the remaining buildings.
+    """
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.parent = {}
+        self.rank = {}
+        self.count = 0
+
+    def __len__(self):
+        return len(self.parent)
+
+    def __contains__(self, tile):
+        return tile in self.parent
+
+    def copy(self):
+        other = RoadComponents(self.height, self.width)
+        other.parent = self.parent.copy()
+        other.rank = self.rank.copy()
+        other.count = self.count
+        return other
+
+    def add(self, y, x):
+        tile = (y, x)
+        if tile in self.parent:
+            return self.count
+        self.parent[tile] = tile
+        self.rank[tile] = 0
+        self.count += 1
+        for neighbour in ((y - 1, x), (y, x - 1), (y + 1, x), (y, x + 1)):
+            if neighbour in self.parent:
+                self._union(tile, neighbour)
+        return self.count
+
+    def remove(self, y, x):
+        if (y, x) not in self.parent:
+            return self.count
+        tiles = list(self.parent)
+        tiles.remove((y, x))
+        return self.rebuild(tiles)
+
+    def rebuild(self, tiles):
+        self.parent = {}
+        self.rank = {}
+        self.count = 0
+        for y, x in tiles:
+            self.add(y, x)
+        return self.count
+
+    def find(self, tile):
+        parent = self.parent
+        while parent[tile] != tile:
+            parent[tile] = parent[parent[tile]]
+            tile = parent[tile]
+        return tile
+
+    def _union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return
+        if self.rank[a] < self.rank[b]:
+            a, b = b, a
+        self.parent[b] = a
+        if self.rank[a] == self.rank[b]:
+            self.rank[a] += 1
+        self.count -= 1
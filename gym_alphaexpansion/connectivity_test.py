@@ -0,0 +1,45 @@
+import random
+import unittest
+
+from gym_alphaexpansion.connectivity import RoadComponents
+
+
+def flood_fill_count(tiles):
+    not_visited = set(tiles)
+    count = 0
+    while not_visited:
+        stack = [not_visited.pop()]
+        while stack:
+            y, x = stack.pop()
+            for neighbour in ((y - 1, x), (y, x - 1), (y + 1, x), (y, x + 1)):
+                if neighbour in not_visited:
+                    not_visited.remove(neighbour)
+                    stack.append(neighbour)
+        count += 1
+    return count
+
+
+class RoadComponentsTest(unittest.TestCase):
+    def test_matches_flood_fill_while_adding(self):
+        rng = random.Random(0)
+        components = RoadComponents(16, 28)
+        tiles = []
+        for _ in range(300):
+            tile = (rng.randrange(16), rng.randrange(28))
+            components.add(*tile)
+            if tile not in tiles:
+                tiles.append(tile)
+            self.assertEqual(components.count, flood_fill_count(tiles))
+
+    def test_remove_splits_components(self):
+        components = RoadComponents(16, 28)
+        for x in range(5):
+            components.add(3, x)
+        self.assertEqual(components.count, 1)
+        self.assertEqual(components.remove(3, 2), 2)
+        self.assertEqual(len(components), 4)
+        self.assertEqual(components.remove(0, 0), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
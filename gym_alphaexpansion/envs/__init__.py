@@ -0,0 +1,19 @@
+import importlib
+
+# imported on first use, so that making a single env does not pay for multiprocessing, asyncio and sockets
+_LAZY_IMPORTS = {
+    'AlphaExpansionVecEnv': 'gym_alphaexpansion.envs.alphaexpansion_vec_env',
+    'SubprocVecEnv': 'gym_alphaexpansion.envs.subproc_vec_env',
+    'EnvClient': 'gym_alphaexpansion.envs.env_server',
+    'EnvServer': 'gym_alphaexpansion.envs.env_server',
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    return getattr(importlib.import_module(_LAZY_IMPORTS[name]), name)
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_IMPORTS))
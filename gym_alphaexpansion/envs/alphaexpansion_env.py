@@ -1,12 +1,12 @@
-import collections
-import operator
-
 import gym
-from alphaexpansion import main, gamerules, display
+from alphaexpansion import gamerules
 import numpy as np
 
-from gym_alphaexpansion import utils
+from gym_alphaexpansion import observation, profiling, state, utils
+from gym_alphaexpansion.map_cache import DEFAULT_MAP_CACHE, MapCache
 
+INFO_MODES = ('lean', 'diagnostics')
+OBSERVATION_ENCODINGS = ('dense', 'packed')
 MAX_STEPS = 10000
 HEIGHT = 7
 WIDTH = 7
@@ -14,48 +14,93 @@ MIN_FORESTS = 4
 MIN_MOUNTAINS = 4
 
 
+def make_game(seed, map_cache=DEFAULT_MAP_CACHE, height=HEIGHT, width=WIDTH, min_forests=MIN_FORESTS,
+              min_mountains=MIN_MOUNTAINS):
+    """ New game with its (W, H) terrain and terrain one-hot arrays, map_cache=None always generates the map."""
+    if map_cache is None:
+        map_cache = MapCache(maxsize=0)
+    return map_cache.new_game(seed, height=height, width=width, min_forests=min_forests, min_mountains=min_mountains)
+
+
+# 34x28x16=15232 possible actions by default
+def action_space(game):
+    # building id (0 = right click), x, y
+    action = gym.spaces.MultiDiscrete(
+        [len(gamerules.BUILDING_DEFINITIONS)+1, game.map.CHUNK_WIDTH, game.map.CHUNK_HEIGHT])
+    return action
+
+
+def observation_space(game):
+    # relative income is logarithmically scaled relative to the largest abs income being 1 or -1
+    # terrain is the tile type of every space
+    # buildings is the building type on every space (-1 is no building)
+    # building_levels are the building levels relative to that building type's max level currently out on the field
+    # building_efficiencies is the raw efficiency of the building on every space (0 is no building)
+    return gym.spaces.Dict(
+        {"relative_income": gym.spaces.Box(low=-1, high=1,
+                                           shape=(game.map.CHUNK_WIDTH, game.map.CHUNK_HEIGHT,
+                                                  len(gamerules.RESOURCE_DEFINITIONS)), dtype=np.float32),
+         "terrain": gym.spaces.Box(low=0, high=1,
+                                   shape=(game.map.CHUNK_WIDTH, game.map.CHUNK_HEIGHT,
+                                          len(gamerules.TILE_DEFINITIONS)), dtype=np.uint8),
+         "buildings": gym.spaces.Box(low=0, high=1,
+                                     shape=(game.map.CHUNK_WIDTH, game.map.CHUNK_HEIGHT,
+                                            len(gamerules.BUILDING_DEFINITIONS)), dtype=np.uint8),
+         "building_levels": gym.spaces.Box(low=0, high=1,
+                                           shape=(game.map.CHUNK_WIDTH, game.map.CHUNK_HEIGHT, 1),
+                                           dtype=np.float32),
+         "building_efficiencies": gym.spaces.Box(low=0, high=np.inf,
+                                                 shape=(game.map.CHUNK_WIDTH, game.map.CHUNK_HEIGHT, 1),
+                                                 dtype=np.float32),
+         "can_upgrade": gym.spaces.Box(low=0, high=1,
+                                       shape=(game.map.CHUNK_WIDTH, game.map.CHUNK_HEIGHT, 1),
+                                       dtype=np.uint8),
+         "can_build": gym.spaces.Box(low=0, high=1,
+                                     shape=(game.map.CHUNK_WIDTH, game.map.CHUNK_HEIGHT,
+                                            len(gamerules.BUILDING_DEFINITIONS)),
+                                     dtype=np.uint8)})
+
+
 class AlphaExpansionEnv(gym.Env):
     metadata = {'render.modes': ['human']}
 
-    def __init__(self):
+    def __init__(self, render_mode='human', instrument=False, info_mode='lean',
+                 map_cache=DEFAULT_MAP_CACHE, map_pool=None, observation_encoding='dense', height=HEIGHT, width=WIDTH,
+                 min_forests=MIN_FORESTS, min_mountains=MIN_MOUNTAINS):
+        if info_mode not in INFO_MODES:
+            raise ValueError("info_mode must be one of %s, got %r" % (INFO_MODES, info_mode))
+        if observation_encoding not in OBSERVATION_ENCODINGS:
+            raise ValueError("observation_encoding must be one of %s, got %r"
+                             % (OBSERVATION_ENCODINGS, observation_encoding))
+        # packed observations bit-pack the 0/1 planes and keep one income value per resource, see
+        # observation.unpack_observation()
+        self.observation_encoding = observation_encoding
         self.map_seed = None
+        # map parameters of main.Game, the observation and action spaces follow the size of the generated map
+        self.map_kwargs = {"height": height, "width": width, "min_forests": min_forests, "min_mountains": min_mountains}
+        # seeded maps are generated once and cloned from map_cache on every reset()
+        self.map_cache = map_cache
+        # with a map_pool.MapPool every reset() draws one of its maps, seed() then picks the map id instead
+        self.map_pool = map_pool
+        self.pool_random = np.random.RandomState()
+        # lean info only carries scalars, diagnostics adds stats()
+        self.info_mode = info_mode
+        # per-phase step timings and counters, see stats()
+        self.profiler = profiling.StepProfiler() if instrument else None
+        # the display is only created on the first render(), render_mode=None never creates it
+        self.render_mode = render_mode
+        self._display = None
         self.reset()
         self.action_space = self._action_space()
         self.observation_space = self._observation_space()
-        self.display = display.GameDisplay(height=HEIGHT, width=WIDTH)
 
-    # 34x28x16=15232 possible actions by default
     def _action_space(self):
-        # building id (0 = right click), x, y
-        action = gym.spaces.MultiDiscrete(
-            [len(gamerules.BUILDING_DEFINITIONS)+1, self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT])
-        return action
+        return action_space(self.game)
 
     def _observation_space(self):
-        # relative income is logarithmically scaled relative to the largest abs income being 1 or -1
-        # terrain is the tile type of every space
-        # buildings is the building type on every space (-1 is no building)
-        # building_levels are the building levels relative to that building type's max level currently out on the field
-        return gym.spaces.Dict(
-            {"relative_income": gym.spaces.Box(low=-1, high=1,
-                                               shape=(self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT,
-                                                      len(gamerules.RESOURCE_DEFINITIONS)), dtype=np.float32),
-             "terrain": gym.spaces.Box(low=0, high=1,
-                                       shape=(self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT,
-                                              len(gamerules.TILE_DEFINITIONS)), dtype=np.uint8),
-             "buildings": gym.spaces.Box(low=0, high=1,
-                                         shape=(self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT,
-                                                len(gamerules.BUILDING_DEFINITIONS)), dtype=np.uint8),
-             "building_levels": gym.spaces.Box(low=0, high=1,
-                                               shape=(self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT, 1),
-                                               dtype=np.float32),
-             "can_upgrade": gym.spaces.Box(low=0, high=1,
-                                           shape=(self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT, 1),
-                                           dtype=np.uint8),
-             "can_build": gym.spaces.Box(low=0, high=1,
-                                         shape=(self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT,
-                                                len(gamerules.BUILDING_DEFINITIONS)),
-                                         dtype=np.uint8)})
+        if self.observation_encoding == 'packed':
+            return observation.packed_observation_space(observation_space(self.game))
+        return observation_space(self.game)
 
     def step(self, action):
         """
@@ -86,18 +131,49 @@ class AlphaExpansionEnv(gym.Env):
                  However, official evaluations of your agent are not allowed to
                  use this for learning.
         """
+        if self.profiler is not None:
+            return self._profiled_step(action)
         action_useful = self._take_action(action)
-        self.game.proceedTick()
+        self._proceed_tick()
         reward = self._get_reward(action_useful)
         self.total_reward += reward
         ob = self._get_observation()
-        info = self._get_info(ob)
         episode_over = MAX_STEPS < self.game.tick
+        info = self._get_info(ob, episode_over)
         return ob, reward, episode_over, info
 
+    def _profiled_step(self, action):
+        profiler = self.profiler
+        profiler.start()
+        action_useful = self._take_action(action)
+        profiler.lap('action')
+        self._proceed_tick()
+        profiler.lap('tick')
+        reward = self._get_reward(action_useful)
+        self.total_reward += reward
+        profiler.lap('reward')
+        ob = self._get_observation()
+        profiler.lap('observation')
+        episode_over = MAX_STEPS < self.game.tick
+        info = self._get_info(ob, episode_over)
+        profiler.lap('info')
+        if not action_useful:
+            profiler.useless_actions += 1
+        return ob, reward, episode_over, info
+
+    def stats(self):
+        """ Step counters and, with instrument=True, cumulative and last-step phase timings in nanoseconds."""
+        stats = {"buildings": self.map_snapshot.building_count}
+        if self.profiler is not None:
+            stats.update(self.profiler.stats())
+        return stats
+
     def reset(self):
-        self.game = main.Game(
-            seed=self.map_seed, height=HEIGHT, width=WIDTH, min_forests=MIN_FORESTS, min_mountains=MIN_MOUNTAINS)
+        if self.map_pool is not None:
+            map_id = self.map_seed if self.map_seed is not None else self.map_pool.sample(self.pool_random)
+            self.game, self.terrain, self.terrain_one_hot = self.map_pool.new_game(map_id)
+        else:
+            self.game, self.terrain, self.terrain_one_hot = make_game(self.map_seed, self.map_cache, **self.map_kwargs)
         self.total_reward = 0
         self.rewards_given = {"resources": {}, "buildings": {}, "income": {}}
         for resource in gamerules.RESOURCE_DEFINITIONS:
@@ -106,22 +182,56 @@ class AlphaExpansionEnv(gym.Env):
             self.rewards_given["buildings"][building] = False
         for resource in gamerules.RESOURCE_DEFINITIONS:
             self.rewards_given["income"][resource] = False
-        self.map_ndarray = np.asarray(self.game.map.map).transpose()
-        self.terrain = np.log2(utils.tile_getter(self.map_ndarray)).astype(np.uint8)
-        self.terrain_one_hot = np.eye(len(gamerules.TILE_DEFINITIONS), dtype=np.uint8)[self.terrain]
+        self.map_snapshot = utils.MapSnapshot(self.game, tile=self.terrain)
+        self.observation_state = observation.ObservationState(
+            self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT,
+            observation.allocate_observation(observation_space(self.game)))
+        self.observation_state.reset(self.map_snapshot, self.terrain_one_hot)
+        self.action_mask_buffer = np.zeros(self._action_space().nvec, dtype=bool)
+        self.action_mask_view = self.action_mask_buffer.reshape(-1).view()
+        self.action_mask_view.flags.writeable = False
         return self._get_observation()
 
+    @property
+    def display(self):
+        if self._display is None:
+            from alphaexpansion import display
+            self._display = display.GameDisplay(height=self.map_kwargs["height"], width=self.map_kwargs["width"])
+        return self._display
+
     def render(self, mode='human', close=False):
+        if self.render_mode is None:
+            return
         self.display.show_screen(self.game)
 
     def seed(self, seed=None):
         self.map_seed = seed
 
+    def get_state(self):
+        """ Snapshot of the episode that set_state() can return to, for tree search."""
+        return {"game": state.GameState(self.game),
+                "total_reward": self.total_reward,
+                "rewards_given": {kind: dict(given) for kind, given in self.rewards_given.items()}}
+
+    def set_state(self, env_state):
+        """ Returns the current episode to a get_state() snapshot and returns its observation."""
+        env_state["game"].restore(self.game)
+        self.total_reward = env_state["total_reward"]
+        self.rewards_given = {kind: dict(given) for kind, given in env_state["rewards_given"].items()}
+        self.map_snapshot.sync_all()
+        return self._get_observation()
+
     def _take_action(self, action):
         if action[0] > 0:
-            self.game.gym_left_click(action[1], action[2], action[0]-1)
+            result = self.game.gym_left_click(action[1], action[2], action[0]-1)
         else:
-            self.game.gym_right_click(action[1], action[2])
+            result = self.game.gym_right_click(action[1], action[2])
+        self.map_snapshot.sync_tile(action[1], action[2])
+        return result
+
+    def _proceed_tick(self):
+        self.game.proceedTick()
+        self.map_snapshot.sync_tick()
 
     def _get_reward(self, action_useful):
         """ Reward is given for the first building, first resource, and first income. Punished if action not useful."""
@@ -156,53 +266,28 @@ class AlphaExpansionEnv(gym.Env):
         return reward
 
     def _get_observation(self):
-        relative_incomes = utils.abs_max_scaling(
-            utils.negative_allowing_log_10(
-                 np.asarray(list(self.game.balDiff.values())))).astype(np.float32)
-        stacked_relative_income_planes = np.empty((self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT, 0))
-        for relative_income in relative_incomes:
-            stacked_relative_income_planes = \
-                np.dstack(
-                    (stacked_relative_income_planes,
-                     np.full((self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT, 1), relative_income)))
-        buildings = np.zeros((self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT), dtype=np.uint8)
-        building_efficiencies = np.zeros((self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT, 1), dtype=np.float32)
-        building_dict = collections.defaultdict(list)
-        max_level_building_dict = collections.OrderedDict()
-        can_upgrade = np.zeros((self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT, 1), dtype=np.uint8)
-        can_build = np.empty((self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT))
-        for building_id in range(len(gamerules.BUILDING_DEFINITIONS)):
-            can_build = np.dstack((can_build,
-                                   utils.can_build(self.map_ndarray,
-                                                   np.full_like(self.map_ndarray, building_id),
-                                                   np.full_like(self.map_ndarray, self.game))))
-        for building in self.game.buildings:
-            buildings[building.x][building.y] = building.build + 1
-            building_efficiencies[building.x][building.y][0] = building.eff
-            building_dict[building.build].append(building.level)
-            if gamerules.isAffordable(building.build, building.level + 1, self.game):
-                can_upgrade[building.x][building.y][0] = 1
-        buildings_one_hot = np.eye(len(gamerules.BUILDING_DEFINITIONS) + 1, dtype=np.uint8)[buildings]
-        buildings_one_hot = np.dsplit(buildings_one_hot, [1])[1]  # lop off first layer
-        for building_id, level_list in building_dict.items():
-            max_level_building_dict[building_id] = np.asarray(level_list).max()
-        building_levels = np.zeros((self.game.map.CHUNK_WIDTH, self.game.map.CHUNK_HEIGHT, 1), dtype=np.float32)
-        for building in self.game.buildings:
-            if max_level_building_dict[building.build] > 0:
-                building_levels[building.x][building.y][0] = building.level / max_level_building_dict[building.build]
-            else:
-                building_levels[building.x][building.y][0] = 1
-        space = {"relative_income": stacked_relative_income_planes,
-                 "terrain": self.terrain_one_hot,
-                 "buildings": buildings_one_hot,
-                 "building_levels": building_levels,
-                 "building_efficiencies": building_efficiencies,
-                 "can_upgrade": can_upgrade,
-                 "can_build": can_build
-        }
-        return space
-
-    def _get_info(self, obs):
+        """ Refreshes the persistent observation planes and returns a copy of them."""
+        self.observation_state.update()
+        if self.observation_encoding == 'packed':
+            return observation.pack_observation(self.observation_state.observation())
+        return {key: plane.copy() for key, plane in self.observation_state.observation().items()}
+
+    def action_mask(self):
+        """ Flat boolean mask of the MultiDiscrete actions in (building + 1, x, y) order, as of the last observation.
+
+        The returned array is read-only and reused by the next call, masks.sample_masked() draws actions from it.
+        """
+        observation_state = self.observation_state
+        observation_state.can_build_mask.action_mask(
+            observation_state.can_build, building=self.map_snapshot.building,
+            can_upgrade=observation_state.can_upgrade, out=self.action_mask_buffer)
+        return self.action_mask_view
+
+    def _get_info(self, obs, episode_over=False):
         info = {"total_reward": self.total_reward}
+        if episode_over:
+            info["terminal_observation"] = obs
+        if self.info_mode == 'diagnostics':
+            info.update(self.stats())
         return info
 
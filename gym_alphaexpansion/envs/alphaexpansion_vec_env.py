@@ -0,0 +1,119 @@
+import numpy as np
+
+from gym_alphaexpansion import observation, utils
+from gym_alphaexpansion.envs import alphaexpansion_env as ae
+
+
+class AlphaExpansionVecEnv(object):
+    """ Steps num_envs AlphaExpansion games in lockstep.
+
+    Observations are written into stacked (N, W, H, C) buffers that are shared between steps, so copy them if they
+    need to outlive the next call to step() or reset(). Finished games are reset automatically, their last
+    observation is handed out as info["terminal_observation"].
+    """
+
+    def __init__(self, num_envs, map_cache=ae.DEFAULT_MAP_CACHE, height=ae.HEIGHT, width=ae.WIDTH,
+                 min_forests=ae.MIN_FORESTS, min_mountains=ae.MIN_MOUNTAINS):
+        self.num_envs = num_envs
+        self.map_seeds = [None] * num_envs
+        self.map_cache = map_cache
+        self.map_kwargs = {"height": height, "width": width, "min_forests": min_forests, "min_mountains": min_mountains}
+        template, _, _ = ae.make_game(None, None, **self.map_kwargs)
+        self.games = [template] * num_envs
+        self.action_space = ae.action_space(template)
+        self.observation_space = ae.observation_space(template)
+        self.buffers = {key: np.zeros((num_envs,) + space.shape, dtype=space.dtype)
+                        for key, space in self.observation_space.spaces.items()}
+        self.observation_states = [
+            observation.ObservationState(template.map.CHUNK_WIDTH, template.map.CHUNK_HEIGHT,
+                                         {key: buffer[i] for key, buffer in self.buffers.items()})
+            for i in range(num_envs)]
+        self.bal_diff = np.zeros((num_envs, len(template.balDiff)), dtype=np.float64)
+        # reward is the income of resources 1 and 2, located by key since the income planes follow balDiff order
+        self.reward_columns = [list(template.balDiff).index(resource_id) for resource_id in (1, 2)]
+        self.relative_income = np.zeros_like(self.bal_diff)
+        self.income_abs_max = np.zeros((num_envs, 1), dtype=np.float64)
+        self.rewards = np.zeros(num_envs, dtype=np.float64)
+        self.total_rewards = np.zeros(num_envs, dtype=np.float64)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        self.action_mask_buffer = np.zeros((num_envs,) + tuple(self.action_space.nvec), dtype=bool)
+        self.action_mask_view = self.action_mask_buffer.reshape(num_envs, -1).view()
+        self.action_mask_view.flags.writeable = False
+        self.reset()
+
+    def seed(self, seed=None):
+        """ Pins the maps, a single seed is offset per env, a sequence gives every env its own seed."""
+        if seed is None or np.isscalar(seed):
+            self.map_seeds = [None if seed is None else seed + i for i in range(self.num_envs)]
+        else:
+            self.map_seeds = list(seed)
+        return self.map_seeds
+
+    def reset(self):
+        for i in range(self.num_envs):
+            self._reset_env(i)
+        self._gather_bal_diff()
+        self._update_observations()
+        return self.buffers
+
+    def step(self, actions):
+        for game, observation_state, action in zip(self.games, self.observation_states, actions):
+            if action[0] > 0:
+                game.gym_left_click(action[1], action[2], action[0]-1)
+            else:
+                game.gym_right_click(action[1], action[2])
+            observation_state.map_snapshot.sync_tile(action[1], action[2])
+            game.proceedTick()
+            observation_state.map_snapshot.sync_tick()
+        self._gather_bal_diff()
+        utils.income_rewards(self.bal_diff, self.reward_columns, out=self.rewards)
+        self.total_rewards += self.rewards
+        self._update_observations()
+        infos = [{"total_reward": total_reward} for total_reward in self.total_rewards]
+        for i, game in enumerate(self.games):
+            self.dones[i] = ae.MAX_STEPS < game.tick
+        if self.dones.any():
+            reset_envs = np.flatnonzero(self.dones)
+            for i in reset_envs:
+                infos[i]["terminal_observation"] = {key: buffer[i].copy() for key, buffer in self.buffers.items()}
+                self._reset_env(i)
+            self._gather_bal_diff(reset_envs)
+            self._update_income()
+            for i in reset_envs:
+                self.observation_states[i].update(income=False)
+        return self.buffers, self.rewards.copy(), self.dones.copy(), infos
+
+    def action_mask(self):
+        """ (N, n_actions) boolean masks laid out like AlphaExpansionEnv.action_mask(), as of the last observations.
+
+        The returned array is read-only and reused by the next call.
+        """
+        for observation_state, out in zip(self.observation_states, self.action_mask_buffer):
+            observation_state.can_build_mask.action_mask(
+                observation_state.can_build, building=observation_state.map_snapshot.building,
+                can_upgrade=observation_state.can_upgrade, out=out)
+        return self.action_mask_view
+
+    def close(self):
+        self.games = []
+        self.observation_states = []
+
+    def _reset_env(self, i):
+        game, terrain, terrain_one_hot = ae.make_game(self.map_seeds[i], self.map_cache, **self.map_kwargs)
+        self.games[i] = game
+        self.total_rewards[i] = 0
+        self.observation_states[i].reset(utils.MapSnapshot(game, tile=terrain), terrain_one_hot)
+
+    def _gather_bal_diff(self, envs=None):
+        for i in range(self.num_envs) if envs is None else envs:
+            utils.bal_diff_array(self.games[i], out=self.bal_diff[i])
+
+    def _update_observations(self):
+        self._update_income()
+        for observation_state in self.observation_states:
+            observation_state.update(income=False)
+
+    def _update_income(self):
+        # relative to the largest abs income of every env separately
+        utils.relative_income(self.bal_diff, out=self.relative_income, abs_max=self.income_abs_max)
+        self.buffers["relative_income"][...] = self.relative_income[:, np.newaxis, np.newaxis, :]
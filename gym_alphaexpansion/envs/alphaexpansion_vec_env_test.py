@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+
+from gym_alphaexpansion import masks
+from gym_alphaexpansion.envs.alphaexpansion_env import AlphaExpansionEnv
+from gym_alphaexpansion.envs.alphaexpansion_vec_env import AlphaExpansionVecEnv
+
+
+class AlphaExpansionVecEnvTest(unittest.TestCase):
+    def assert_observations_equal(self, single, batched, i):
+        self.assertEqual(set(single), set(batched))
+        for key in single:
+            np.testing.assert_array_equal(single[key], batched[key][i], key)
+
+    def test_matches_single_env(self, steps=50):
+        env = AlphaExpansionEnv(render_mode=None)
+        envs = AlphaExpansionVecEnv(1)
+        env.seed(0)
+        envs.seed(0)
+        self.assert_observations_equal(env.reset(), envs.reset(), 0)
+        rng = np.random.RandomState(0)
+        for _ in range(steps):
+            np.testing.assert_array_equal(envs.action_mask()[0], env.action_mask())
+            action = masks.sample_masked(env.action_space, env.action_mask(), rng)
+            observation, reward, done, info = env.step(action)
+            observations, rewards, dones, infos = envs.step([action])
+            self.assert_observations_equal(observation, observations, 0)
+            self.assertAlmostEqual(rewards[0], reward)
+            self.assertEqual(dones[0], done)
+            self.assertAlmostEqual(infos[0]["total_reward"], info["total_reward"])
+        envs.close()
+        env.close()
+
+    def test_action_mask_shape(self):
+        envs = AlphaExpansionVecEnv(3)
+        envs.reset()
+        mask = envs.action_mask()
+        self.assertEqual(mask.shape, (3, int(np.prod(envs.action_space.nvec))))
+        self.assertFalse(mask.flags.writeable)
+        envs.close()
+        self.assertEqual(envs.observation_states, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
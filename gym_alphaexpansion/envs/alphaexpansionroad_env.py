@@ -1,13 +1,13 @@
 import collections
 import operator
-import profile
 import math
 
 import gym
-from alphaexpansion import main, gamerules, display
+from alphaexpansion import gamerules
 import numpy as np
 
-from gym_alphaexpansion import utils
+from gym_alphaexpansion import connectivity, masks, profiling, state, utils
+from gym_alphaexpansion.map_cache import DEFAULT_MAP_CACHE, MapCache
 
 ALLOWED_ROADS = 0
 
@@ -22,46 +22,49 @@ road_adjacent_tile_flavor_score = {
 }
 
 
-def disjoint_road_counter(map, buildings):
-    roads_not_visited = buildings.copy()
-    count = 0
-    while roads_not_visited:
-        disjoint_road_counter_helper(map, roads_not_visited, roads_not_visited.pop())
-        count += 1
-    return count
-
-
-def disjoint_road_counter_helper(map, roads_not_visited, road):
-    x = road.x
-    y = road.y
-    other_tiles = []
-    if y - 1 >= 0:
-        other_tiles.append(map[y - 1][x])
-    if x - 1 >= 0:
-        other_tiles.append(map[y][x - 1])
-    if len(map) > y + 1:
-        other_tiles.append(map[y + 1][x])
-    if x + 1 < len(map[0]):
-        other_tiles.append(map[y][x + 1])
-    for other_tile in other_tiles:
-        if hasattr(other_tile, 'build') and other_tile in roads_not_visited:
-            roads_not_visited.remove(other_tile)
-            disjoint_road_counter_helper(map, roads_not_visited, other_tile)
+def flavor_by_tile_index():
+    """ road_adjacent_tile_flavor_score indexed by tile index (log2 of the tile flag) instead of tile flag."""
+    flavor = np.zeros(len(gamerules.TILE_DEFINITIONS), dtype=np.float64)
+    for tile, score in road_adjacent_tile_flavor_score.items():
+        flavor[int(math.log2(tile))] = score
+    return flavor
 
 
+ROAD = 1
+INFO_MODES = ('lean', 'diagnostics')
 MAX_STEPS = 500
 
 
 class AlphaExpansionRoadEnv(gym.Env):
     metadata = {'render.modes': ['human']}
 
-    def __init__(self, ravel=True):
+    def __init__(self, ravel=True, copy_observation=True, render_mode='human', instrument=False, info_mode='lean',
+                 map_cache=DEFAULT_MAP_CACHE, map_pool=None, height=None, width=None, min_forests=None,
+                 min_mountains=None):
+        if info_mode not in INFO_MODES:
+            raise ValueError("info_mode must be one of %s, got %r" % (INFO_MODES, info_mode))
         self.map_seed = None
+        # map parameters of main.Game, None keeps its default, the spaces follow the size of the generated map
+        self.map_kwargs = {"height": height, "width": width, "min_forests": min_forests, "min_mountains": min_mountains}
+        # seeded maps are generated once and cloned from map_cache on every reset(), None always generates
+        self.map_cache = map_cache if map_cache is not None else MapCache(maxsize=0)
+        # with a map_pool.MapPool every reset() draws one of its maps, seed() then picks the map id instead
+        self.map_pool = map_pool
+        self.pool_random = np.random.RandomState()
+        # lean info only carries scalars, diagnostics adds the observation and stats()
+        self.info_mode = info_mode
+        # per-phase step timings and counters, see stats()
+        self.profiler = profiling.StepProfiler() if instrument else None
+        # the display is only created on the first render(), render_mode=None never creates it
+        self.render_mode = render_mode
+        self._display = None
         self.ravel = ravel
+        # observations are copies of a buffer updated in place, copy_observation=False returns read-only views of it
+        # instead, which change on the next step() and reset()
+        self.copy_observation = copy_observation
         self.reset()
         self.action_space = self._action_space()
         self.observation_space = self._observation_space()
-        self.display = display.GameDisplay()
 
     # 28x16 possible actions by default
     def _action_space(self):
@@ -103,86 +106,208 @@ class AlphaExpansionRoadEnv(gym.Env):
                  However, official evaluations of your agent are not allowed to
                  use this for learning.
         """
+        if self.profiler is not None:
+            return self._profiled_step(action)
         action_useful = self._take_action(action)
-        self.game.proceedTick()
+        self._proceed_tick()
         reward = self._get_reward(action_useful)
         self.total_reward += reward
         ob = self._get_observation(ravel=self.ravel)
-        info = self._get_info(ob)
         episode_over = MAX_STEPS < self.game.tick
+        info = self._get_info(ob, episode_over)
         return ob, reward, episode_over, info
 
+    def _profiled_step(self, action):
+        profiler = self.profiler
+        profiler.start()
+        action_useful = self._take_action(action)
+        profiler.lap('action')
+        self._proceed_tick()
+        profiler.lap('tick')
+        reward = self._get_reward(action_useful)
+        self.total_reward += reward
+        profiler.lap('reward')
+        ob = self._get_observation(ravel=self.ravel)
+        profiler.lap('observation')
+        episode_over = MAX_STEPS < self.game.tick
+        info = self._get_info(ob, episode_over)
+        profiler.lap('info')
+        if not action_useful:
+            profiler.useless_actions += 1
+        return ob, reward, episode_over, info
+
+    def stats(self):
+        """ Step counters and, with instrument=True, cumulative and last-step phase timings in nanoseconds."""
+        stats = {"buildings": self.map_snapshot.building_count}
+        if self.profiler is not None:
+            stats.update(self.profiler.stats())
+        return stats
+
     def reset(self):
-        self.game = main.Game(seed=self.map_seed)
+        if self.map_pool is not None:
+            map_id = self.map_seed if self.map_seed is not None else self.map_pool.sample(self.pool_random)
+            self.game, terrain, terrain_one_hot = self.map_pool.new_game(map_id)
+        else:
+            self.game, terrain, terrain_one_hot = self.map_cache.new_game(self.map_seed, **self.map_kwargs)
         self.game.balance[2] = 1e30
-        self.rewarded_buildings = []
-        self.scored_tiles = []
+        self.map_snapshot = utils.MapSnapshot(self.game, track_efficiency=False, tile=terrain)
+        self.map_snapshot.consume_changes()
+        # the road env works on (y, x) like game.map.map
+        self.terrain = self.map_snapshot.tile.transpose()
+        self.flavor = flavor_by_tile_index()[self.terrain]
+        # terrain one-hot planes followed by the road plane, only the road plane changes during an episode
+        self.observation_buffer = np.zeros(self.terrain.shape + (len(gamerules.TILE_DEFINITIONS) + 1,), dtype=np.uint8)
+        self.observation_buffer[:, :, :-1] = terrain_one_hot.transpose(1, 0, 2)
+        self.observation_views = {True: self.observation_buffer.ravel().view(),
+                                  False: self.observation_buffer.view()}
+        for view in self.observation_views.values():
+            view.flags.writeable = False
+        # roads already rewarded and tiles already counted as adjacent to a road, indexed by (y, x)
+        self.roads = np.zeros(self.terrain.shape, dtype=bool)
+        self.scored_tiles = np.zeros(self.terrain.shape, dtype=bool)
         self.disjoint_roads = 0
+        self.road_components = connectivity.RoadComponents(self.game.map.CHUNK_HEIGHT, self.game.map.CHUNK_WIDTH)
+        # whether the terrain of a (y, x) tile takes a road at all, the action mask follows the roads placed on top
+        self.road_terrain = masks.building_tile_compatibility()[self.terrain, ROAD]
+        self.action_mask_buffer = np.zeros(self.game.map.CHUNK_WIDTH * self.game.map.CHUNK_HEIGHT + 1, dtype=bool)
+        self.action_mask_view = self.action_mask_buffer.view()
+        self.action_mask_view.flags.writeable = False
+        self._rebuild_action_mask()
         self.total_reward = 0
         return self._get_observation(ravel=self.ravel)
 
+    @property
+    def display(self):
+        if self._display is None:
+            from alphaexpansion import display
+            self._display = display.GameDisplay(**{name: self.map_kwargs[name] for name in ("height", "width")
+                                                   if self.map_kwargs[name] is not None})
+        return self._display
+
     def render(self, mode='human', close=False):
+        if self.render_mode is None:
+            return
         self.display.show_screen(self.game)
 
     def seed(self, seed=None):
         self.map_seed = seed
 
+    def get_state(self):
+        """ Snapshot of the episode that set_state() can return to, for tree search."""
+        return {"game": state.GameState(self.game),
+                "total_reward": self.total_reward,
+                "disjoint_roads": self.disjoint_roads,
+                "roads": self.roads.copy(),
+                "scored_tiles": self.scored_tiles.copy(),
+                "road_components": self.road_components.copy()}
+
+    def set_state(self, env_state):
+        """ Returns the current episode to a get_state() snapshot and returns its observation."""
+        env_state["game"].restore(self.game)
+        self.map_snapshot.sync_all()
+        self.map_snapshot.consume_changes()
+        self.total_reward = env_state["total_reward"]
+        self.disjoint_roads = env_state["disjoint_roads"]
+        self.roads[...] = env_state["roads"]
+        self.scored_tiles[...] = env_state["scored_tiles"]
+        self.observation_buffer[:, :, -1] = self.roads
+        self.road_components = env_state["road_components"].copy()
+        self._rebuild_action_mask()
+        return self._get_observation(ravel=self.ravel)
+
+    def action_mask(self):
+        """ Flat boolean mask of the Discrete actions, the last one (no action) is always allowed.
+
+        The returned array is read-only and kept up to date as roads are placed, masks.sample_masked() draws actions
+        from it.
+        """
+        if not gamerules.isAffordable(ROAD, 0, self.game):
+            mask = np.zeros_like(self.action_mask_buffer)
+            mask[-1] = True
+            return mask
+        return self.action_mask_view
+
+    def _rebuild_action_mask(self):
+        height, width = self.roads.shape
+        actions = np.arange(len(self.action_mask_buffer) - 1)
+        # action a clicks x = a // width, y = a % width, which is off the map once y runs past the map height
+        xs, ys = actions // width, actions % width
+        on_map = (xs < width) & (ys < height)
+        xs = np.minimum(xs, width - 1)
+        ys = np.minimum(ys, height - 1)
+        self.action_mask_buffer[:-1] = on_map & self.road_terrain[ys, xs] & ~self.roads[ys, xs]
+        self.action_mask_buffer[-1] = True
+
     def _take_action(self, action):
         if self.game.map.CHUNK_WIDTH * self.game.map.CHUNK_HEIGHT == action:
             return True
-        return self.game.gym_left_click(action // self.game.map.CHUNK_WIDTH, action % self.game.map.CHUNK_WIDTH, 1)
+        x, y = action // self.game.map.CHUNK_WIDTH, action % self.game.map.CHUNK_WIDTH
+        result = self.game.gym_left_click(x, y, ROAD)
+        self.map_snapshot.sync_tile(x, y)
+        return result
+
+    def _proceed_tick(self):
+        self.game.proceedTick()
+        self.map_snapshot.sync_tick()
 
     def _get_reward(self, action_useful):
         """ Reward is given for number of tiles adjacent to a road"""
         reward = 0.0
-        new_road = None
-        for tile in self.game.buildings:
-            if tile not in self.rewarded_buildings:
-                y = tile.y
-                x = tile.x
-                reward = self._score_new_road(self.game.map, y, x)
-                self.rewarded_buildings.append(tile)
-                new_road = tile
+        changed = self.map_snapshot.consume_changes()
+        if changed is None:
+            # the snapshot resynced the whole map, compare every tile that has or had a road
+            changed = zip(*np.nonzero(self.map_snapshot.occupied | self.roads.transpose()))
+        new_roads = []
+        for x, y in changed:
+            occupied = self.map_snapshot.occupied[x, y]
+            if occupied and not self.roads[y, x]:
+                new_roads.append((y, x))
+            elif not occupied and self.roads[y, x]:
+                self._set_road(y, x, False)
+                self.road_components.remove(y, x)
+        for y, x in new_roads:
+            self._set_road(y, x)
+        for y, x in new_roads:
+            reward = self._score_new_road(y, x)
+            self.road_components.add(y, x)
         reward += (0 if action_useful else -0.1)
-        self.new_disjoint_roads = disjoint_road_counter(self.game.map.map, self.game.buildings)
+        self.new_disjoint_roads = self.road_components.count
         reward += np.sign(self.disjoint_roads - self.new_disjoint_roads) * self.new_disjoint_roads / 5
         self.disjoint_roads = self.new_disjoint_roads
         return reward
 
     def _get_observation(self, ravel=True):
+        observation = self.observation_views[bool(ravel)]
+        if self.copy_observation:
+            observation = observation.copy()
+        return observation
 
-        terrain = np.log2(utils.tile_getter(np.asarray(self.game.map.map))).astype(np.uint8)
-        terrain_one_hot = np.eye(len(gamerules.TILE_DEFINITIONS), dtype=np.uint8)[terrain]
-        roads = np.zeros(terrain.shape, dtype=np.uint8)
-        for building in self.game.buildings:
-            roads[building.y][building.x] = 1
-        stacked = np.dstack((terrain_one_hot, roads))
-        if ravel:
-            stacked = stacked.ravel()
-        return stacked
-
-    def _get_info(self, obs):
-        info = {"total_reward": self.total_reward,
-                "observation": obs}
+    def _get_info(self, obs, episode_over=False):
+        info = {"total_reward": self.total_reward}
+        if episode_over:
+            info["terminal_observation"] = obs
+        if self.info_mode == 'diagnostics':
+            info["observation"] = obs
+            info.update(self.stats())
         return info
 
-    def _score_new_road(self, game_map, y, x):
+    def _set_road(self, y, x, road=True):
+        self.roads[y, x] = road
+        self.observation_buffer[y, x, -1] = road
+        width = self.roads.shape[1]
+        action = x * width + y
+        if y < width and action < len(self.action_mask_buffer) - 1:
+            self.action_mask_buffer[action] = not road and self.road_terrain[y, x]
+
+    def _score_new_road(self, y, x):
         score = 0.0
-        tile = game_map.map[y][x].tile
-        other_tiles = []
-        if y - 1 >= 0:
-            other_tiles.append(game_map.map[y - 1][x])
-        if x - 1 >= 0:
-            other_tiles.append(game_map.map[y][x - 1])
-        if len(game_map.map) > y + 1:
-            other_tiles.append(game_map.map[y + 1][x])
-        if x + 1 < game_map.CHUNK_WIDTH:
-            other_tiles.append(game_map.map[y][x + 1])
-        for other_tile in other_tiles:
-            if hasattr(other_tile, 'build'):
-                score -= road_adjacent_tile_flavor_score[tile]
-            elif other_tile not in self.scored_tiles:
-                score += road_adjacent_tile_flavor_score[other_tile.tile]
-                self.scored_tiles.append(other_tile)
+        height, width = self.roads.shape
+        for other_y, other_x in ((y - 1, x), (y, x - 1), (y + 1, x), (y, x + 1)):
+            if not (0 <= other_y < height and 0 <= other_x < width):
+                continue
+            if self.roads[other_y, other_x]:
+                score -= self.flavor[y, x]
+            elif not self.scored_tiles[other_y, other_x]:
+                score += self.flavor[other_y, other_x]
+                self.scored_tiles[other_y, other_x] = True
         return score
-
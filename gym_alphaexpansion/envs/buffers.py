@@ -0,0 +1,21 @@
+import gym
+import numpy as np
+
+
+def space_layout(space):
+    """ (shape, dtype) per observation key, a non-Dict space is stored under the key None."""
+    if isinstance(space, gym.spaces.Dict):
+        return {key: (subspace.shape, np.dtype(subspace.dtype)) for key, subspace in space.spaces.items()}
+    if isinstance(space, gym.spaces.MultiBinary):
+        # the envs emit one-hot uint8 planes, not MultiBinary's default int8
+        return {None: (space.shape, np.dtype(np.uint8))}
+    return {None: (space.shape, np.dtype(space.dtype))}
+
+
+def write_observation(observations, i, ob):
+    """ Writes ob into row i of the per-key buffers of a space_layout()."""
+    if None in observations:
+        observations[None][i] = ob
+    else:
+        for key, buffer in observations.items():
+            buffer[i] = ob[key]
@@ -0,0 +1,248 @@
+"""Serves a pool of envs to remote actors over a Unix socket.
+
+    python -m gym_alphaexpansion.envs.env_server --env AlphaExpansionRoad-v0 --num-envs 64 --path /tmp/alphaexpansion.sock
+
+Messages are a little-endian uint32 length, a uint32 header length, a JSON header and the raw bytes of the arrays the
+header lists as [name, dtype, shape], so observations are never pickled. Requests that arrive while a batch of requests
+is being run are run together as the next batch, one client can step many envs with one request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+
+import gym
+import numpy as np
+
+from gym_alphaexpansion.envs.buffers import space_layout, write_observation
+
+PREFIX = struct.Struct('<II')
+
+
+def encode_message(header, arrays=None):
+    """ Chunks of the bytes of one message, ready for writelines() or b''.join()."""
+    specs = []
+    chunks = []
+    for name, array in (arrays or {}).items():
+        array = np.ascontiguousarray(array)
+        specs.append([name, array.dtype.str, list(array.shape)])
+        chunks.append(array.tobytes())
+    header_bytes = json.dumps(dict(header, arrays=specs), separators=(',', ':')).encode()
+    size = 4 + len(header_bytes) + sum(len(chunk) for chunk in chunks)
+    return [PREFIX.pack(size, len(header_bytes)), header_bytes] + chunks
+
+
+def decode_message(body):
+    """ (header, arrays) of a message without its length, the arrays are views of body."""
+    header_size, = struct.unpack_from('<I', body)
+    header = json.loads(bytes(body[4:4 + header_size]))
+    arrays = {}
+    offset = 4 + header_size
+    for name, dtype, shape in header.pop('arrays'):
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(body, dtype=dtype, count=count, offset=offset).reshape(shape)
+        offset += count * dtype.itemsize
+    return header, arrays
+
+
+def _observation_arrays(observations, prefix="observation"):
+    return {(prefix if key is None else prefix + "/" + key): buffer for key, buffer in observations.items()}
+
+
+def _observations(arrays, prefix="observation"):
+    if prefix in arrays:
+        return arrays[prefix]
+    return {name[len(prefix) + 1:]: array for name, array in arrays.items() if name.startswith(prefix + "/")}
+
+
+def _infos(observations, total_rewards, dones):
+    """ Per-env info dicts like the vectorized envs', the terminal observations are rows of done envs in order."""
+    infos = [{"total_reward": float(total_reward)} for total_reward in total_rewards]
+    for row, i in enumerate(np.flatnonzero(dones)):
+        if isinstance(observations, dict):
+            infos[i]["terminal_observation"] = {key: array[row] for key, array in observations.items()}
+        else:
+            infos[i]["terminal_observation"] = observations[row]
+    return infos
+
+
+def _env_ids(env_ids):
+    return None if env_ids is None else [int(i) for i in env_ids]
+
+
+class EnvServer(object):
+    """ Hosts num_envs copies of a registered env for EnvClients connecting to the Unix socket at path.
+
+    Requests are queued by the event loop and run in batches on an executor thread, so the loop keeps accepting
+    requests while envs are stepped. Finished envs are reset on step() like in the vectorized envs, their last
+    observation is sent along as a terminal observation.
+    """
+
+    def __init__(self, env_id, num_envs, path, **env_kwargs):
+        env_kwargs.setdefault('render_mode', None)
+        self.env_id = env_id
+        self.path = path
+        self.envs = [gym.make(env_id, **env_kwargs) for _ in range(num_envs)]
+        self.layout = space_layout(self.envs[0].observation_space)
+        self.requests = None
+        self.server = None
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self):
+        """ Serves until cancelled."""
+        self.requests = asyncio.Queue()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._handle, path=self.path)
+        batches = asyncio.ensure_future(self._run_batches())
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            batches.cancel()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            for env in self.envs:
+                env.close()
+
+    async def _handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                size, = struct.unpack('<I', await reader.readexactly(4))
+                body = await reader.readexactly(size)
+                response = loop.create_future()
+                await self.requests.put((body, response))
+                writer.writelines(await response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.requests.get()]
+            while not self.requests.empty():
+                batch.append(self.requests.get_nowait())
+            responses = await loop.run_in_executor(None, self._run_batch, [body for body, _ in batch])
+            for (_, response), chunks in zip(batch, responses):
+                response.set_result(chunks)
+
+    def _run_batch(self, bodies):
+        responses = []
+        for body in bodies:
+            try:
+                header, arrays = decode_message(body)
+                responses.append(self._run(header, arrays))
+            except Exception as e:  # reported to the client that sent the request
+                responses.append(encode_message({"error": "%s: %s" % (type(e).__name__, e)}))
+        return responses
+
+    def _run(self, header, arrays):
+        op = header["op"]
+        if op == "info":
+            return encode_message({"env_id": self.env_id, "num_envs": len(self.envs)})
+        env_ids = header.get("envs")
+        if env_ids is None:
+            env_ids = range(len(self.envs))
+        if op == "seed":
+            for i, seed in zip(env_ids, header["seeds"]):
+                self.envs[i].seed(seed)
+            return encode_message({})
+        observations = {key: np.empty((len(env_ids),) + shape, dtype=dtype)
+                        for key, (shape, dtype) in self.layout.items()}
+        if op == "reset":
+            for row, i in enumerate(env_ids):
+                write_observation(observations, row, self.envs[i].reset())
+            return encode_message({}, _observation_arrays(observations))
+        if op == "step":
+            rewards = np.empty(len(env_ids), dtype=np.float64)
+            dones = np.empty(len(env_ids), dtype=bool)
+            total_rewards = np.empty(len(env_ids), dtype=np.float64)
+            terminal_observations = {key: np.empty_like(buffer) for key, buffer in observations.items()}
+            finished = 0
+            for row, (i, action) in enumerate(zip(env_ids, arrays["actions"])):
+                ob, rewards[row], dones[row], info = self.envs[i].step(action)
+                total_rewards[row] = info.get("total_reward", np.nan)
+                if dones[row]:
+                    write_observation(terminal_observations, finished, ob)
+                    finished += 1
+                    ob = self.envs[i].reset()
+                write_observation(observations, row, ob)
+            terminal_observations = {key: buffer[:finished] for key, buffer in terminal_observations.items()}
+            return encode_message({}, dict(_observation_arrays(observations),
+                                           **_observation_arrays(terminal_observations, "terminal_observation"),
+                                           rewards=rewards, dones=dones, total_rewards=total_rewards))
+        raise ValueError("unknown op %r" % op)
+
+
+class EnvClient(object):
+    """ Blocking client of an EnvServer, env_ids=None addresses all of the server's envs.
+
+    Returned arrays are views of the response buffer, stacked in env_ids order. step() returns infos like the
+    vectorized envs, with the total reward and, for finished envs, the last observation before their reset.
+    """
+
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        info, _ = self._request({"op": "info"})
+        self.env_id = info["env_id"]
+        self.num_envs = info["num_envs"]
+
+    def reset(self, env_ids=None):
+        _, arrays = self._request({"op": "reset", "envs": _env_ids(env_ids)})
+        return _observations(arrays)
+
+    def step(self, actions, env_ids=None):
+        _, arrays = self._request({"op": "step", "envs": _env_ids(env_ids)}, {"actions": np.asarray(actions)})
+        infos = _infos(_observations(arrays, "terminal_observation"), arrays["total_rewards"], arrays["dones"])
+        return _observations(arrays), arrays["rewards"], arrays["dones"], infos
+
+    def seed(self, seeds, env_ids=None):
+        seeds = [None if seed is None else int(seed) for seed in seeds]
+        self._request({"op": "seed", "envs": _env_ids(env_ids), "seeds": seeds})
+
+    def close(self):
+        self.socket.close()
+
+    def _request(self, header, arrays=None):
+        self.socket.sendall(b''.join(encode_message(header, arrays)))
+        size, = struct.unpack('<I', self._receive(4))
+        header, arrays = decode_message(self._receive(size))
+        if "error" in header:
+            raise RuntimeError(header["error"])
+        return header, arrays
+
+    def _receive(self, size):
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        while view:
+            received = self.socket.recv_into(view)
+            if not received:
+                raise ConnectionError("env server closed the connection")
+            view = view[received:]
+        return buffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a pool of envs over a Unix socket.')
+    parser.add_argument('--env', default='AlphaExpansion-v0')
+    parser.add_argument('--num-envs', type=int, default=64)
+    parser.add_argument('--path', default='/tmp/alphaexpansion.sock')
+    args = parser.parse_args()
+    EnvServer(args.env, args.num_envs, args.path).run()
+
+
+if __name__ == '__main__':
+    main()
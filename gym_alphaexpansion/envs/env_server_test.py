@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+
+from gym_alphaexpansion.envs import env_server
+
+
+def round_trip(header, arrays=None):
+    message = b''.join(env_server.encode_message(header, arrays))
+    size, _ = env_server.PREFIX.unpack_from(message)
+    assert size == len(message) - 4
+    return env_server.decode_message(message[4:])
+
+
+class MessageTest(unittest.TestCase):
+    def test_header_only(self):
+        header, arrays = round_trip({"op": "info", "envs": [0, 2]})
+        self.assertEqual(header, {"op": "info", "envs": [0, 2]})
+        self.assertEqual(arrays, {})
+
+    def test_flat_observations(self):
+        observations = {None: np.arange(3 * 4 * 5, dtype=np.uint8).reshape(3, 4, 5)}
+        rewards = np.array([0.5, -1.0, 2.0])
+        header, arrays = round_trip({}, dict(env_server._observation_arrays(observations), rewards=rewards))
+        decoded = env_server._observations(arrays)
+        self.assertEqual(decoded.dtype, np.uint8)
+        np.testing.assert_array_equal(decoded, observations[None])
+        np.testing.assert_array_equal(arrays["rewards"], rewards)
+
+    def test_dict_observations(self):
+        observations = {'map': np.random.RandomState(0).rand(2, 4, 3).astype(np.float32),
+                        'income': np.array([[1, -2], [3, 4]], dtype=np.int64),
+                        'empty': np.zeros((2, 0), dtype=np.float64)}
+        _, arrays = round_trip({}, env_server._observation_arrays(observations))
+        decoded = env_server._observations(arrays)
+        self.assertEqual(set(decoded), set(observations))
+        for key, array in observations.items():
+            self.assertEqual(decoded[key].dtype, array.dtype, key)
+            np.testing.assert_array_equal(decoded[key], array, key)
+
+    def test_non_contiguous_arrays(self):
+        array = np.arange(20, dtype=np.int32).reshape(4, 5)[:, ::2]
+        _, arrays = round_trip({}, {"a": array})
+        np.testing.assert_array_equal(arrays["a"], array)
+
+    def test_terminal_observations(self):
+        observations = {None: np.arange(3 * 2, dtype=np.float32).reshape(3, 2)}
+        terminal_observations = {None: np.array([[7, 8]], dtype=np.float32)}
+        dones = np.array([False, True, False])
+        _, arrays = round_trip({}, dict(env_server._observation_arrays(observations),
+                                        **env_server._observation_arrays(terminal_observations, "terminal_observation"),
+                                        dones=dones, total_rewards=np.array([1.0, 2.0, 3.0])))
+        np.testing.assert_array_equal(env_server._observations(arrays), observations[None])
+        infos = env_server._infos(env_server._observations(arrays, "terminal_observation"), arrays["total_rewards"],
+                                  arrays["dones"])
+        self.assertEqual([info["total_reward"] for info in infos], [1.0, 2.0, 3.0])
+        self.assertEqual([i for i, info in enumerate(infos) if "terminal_observation" in info], [1])
+        np.testing.assert_array_equal(infos[1]["terminal_observation"], [7, 8])
+
+    def test_dict_terminal_observations(self):
+        terminal_observations = {'map': np.zeros((0, 2, 2), dtype=np.uint8)}
+        _, arrays = round_trip({}, env_server._observation_arrays(terminal_observations, "terminal_observation"))
+        infos = env_server._infos(env_server._observations(arrays, "terminal_observation"), [0.0], [False])
+        self.assertEqual(infos, [{"total_reward": 0.0}])
+
+
+if __name__ == '__main__':
+    unittest.main()
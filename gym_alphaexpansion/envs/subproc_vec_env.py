@@ -0,0 +1,154 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+import gym
+import numpy as np
+
+from gym_alphaexpansion.envs.buffers import space_layout, write_observation
+
+
+def _attach(blocks, num_envs, layout):
+    observations = {key: np.ndarray((num_envs,) + shape, dtype=dtype, buffer=blocks[key].buf)
+                    for key, (shape, dtype) in layout.items()}
+    rewards = np.ndarray((num_envs,), dtype=np.float64, buffer=blocks["rewards"].buf)
+    dones = np.ndarray((num_envs,), dtype=bool, buffer=blocks["dones"].buf)
+    return observations, rewards, dones
+
+
+def _worker(remote, env_id, env_kwargs, env_indices, block_names, num_envs, layout):
+    blocks = {key: shared_memory.SharedMemory(name=name) for key, name in block_names.items()}
+    observations, rewards, dones = _attach(blocks, num_envs, layout)
+    envs = [gym.make(env_id, **env_kwargs) for _ in env_indices]
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                infos = []
+                for env, i, action in zip(envs, env_indices, data):
+                    ob, reward, done, info = env.step(action)
+                    if done:
+                        info["terminal_observation"] = ob
+                        ob = env.reset()
+                    write_observation(observations, i, ob)
+                    rewards[i] = reward
+                    dones[i] = done
+                    infos.append(info)
+                remote.send(infos)
+            elif command == "reset":
+                for env, i in zip(envs, env_indices):
+                    write_observation(observations, i, env.reset())
+                remote.send(None)
+            elif command == "seed":
+                for env, seed in zip(envs, data):
+                    env.seed(seed)
+                remote.send(None)
+            elif command == "close":
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for env in envs:
+            env.close()
+        del observations, rewards, dones
+        for block in blocks.values():
+            block.close()
+        remote.close()
+
+
+class SubprocVecEnv(object):
+    """ Steps num_envs copies of a registered env in num_workers subprocesses.
+
+    Workers write observations, rewards and dones straight into shared memory, only actions and info dicts go
+    through the pipes. The returned observation arrays are the shared buffers and are overwritten by the next call to
+    step() or reset(). Finished envs are reset by their worker, the last observation is in info["terminal_observation"].
+    """
+
+    def __init__(self, env_id, num_envs, num_workers=None, start_method=None, **env_kwargs):
+        self.num_envs = num_envs
+        # workers never render
+        env_kwargs.setdefault('render_mode', None)
+        num_workers = min(num_workers or multiprocessing.cpu_count(), num_envs)
+        template = gym.make(env_id, **env_kwargs)
+        self.action_space = template.action_space
+        self.observation_space = template.observation_space
+        template.close()
+        layout = space_layout(self.observation_space)
+        sizes = {key: num_envs * int(np.prod(shape)) * dtype.itemsize for key, (shape, dtype) in layout.items()}
+        sizes["rewards"] = num_envs * np.dtype(np.float64).itemsize
+        sizes["dones"] = num_envs * np.dtype(bool).itemsize
+        self.blocks = {key: shared_memory.SharedMemory(create=True, size=max(size, 1)) for key, size in sizes.items()}
+        self.observations, self.rewards, self.dones = _attach(self.blocks, num_envs, layout)
+        context = multiprocessing.get_context(start_method)
+        self.env_slices = np.array_split(np.arange(num_envs), num_workers)
+        self.remotes = []
+        self.processes = []
+        block_names = {key: block.name for key, block in self.blocks.items()}
+        for env_indices in self.env_slices:
+            remote, worker_remote = context.Pipe()
+            process = context.Process(
+                target=_worker,
+                args=(worker_remote, env_id, env_kwargs, env_indices.tolist(), block_names, num_envs, layout),
+                daemon=True)
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self.closed = False
+
+    def seed(self, seed=None):
+        """ Seeds every env, a single seed is offset per env, a sequence gives every env its own seed."""
+        if seed is None or np.isscalar(seed):
+            seeds = [None if seed is None else seed + i for i in range(self.num_envs)]
+        else:
+            seeds = list(seed)
+        for remote, env_indices in zip(self.remotes, self.env_slices):
+            remote.send(("seed", [seeds[i] for i in env_indices]))
+        for remote in self.remotes:
+            remote.recv()
+        return seeds
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        for remote in self.remotes:
+            remote.recv()
+        return self._observation()
+
+    def step(self, actions):
+        for remote, env_indices in zip(self.remotes, self.env_slices):
+            remote.send(("step", [actions[i] for i in env_indices]))
+        infos = []
+        for remote in self.remotes:
+            infos.extend(remote.recv())
+        return self._observation(), self.rewards.copy(), self.dones.copy(), infos
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            try:
+                remote.send(("close", None))
+            except (BrokenPipeError, EOFError):
+                pass
+        for process in self.processes:
+            process.join()
+        for remote in self.remotes:
+            remote.close()
+        self.observations = self.rewards = self.dones = None
+        for block in self.blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                # the caller still holds views of the observations, the mapping goes away with them
+                pass
+            block.unlink()
+        self.closed = True
+
+    def __del__(self):
+        if not getattr(self, "closed", True):
+            self.close()
+
+    def _observation(self):
+        if None in self.observations:
+            return self.observations[None]
+        return self.observations
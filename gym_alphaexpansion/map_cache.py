@@ -0,0 +1,109 @@
+import collections
+import copy
+import os
+import pickle
+
+import numpy as np
+from alphaexpansion import gamerules, main
+
+from gym_alphaexpansion import utils
+
+
+class CachedMap(object):
+    """ A generated, never played game together with the precomputed terrain arrays of its map."""
+
+    def __init__(self, game=None, terrain=None, game_bytes=None):
+        if terrain is None:
+            terrain = utils.tile_indices(game)
+        self.terrain = terrain
+        self.terrain.flags.writeable = False
+        self.terrain_one_hot = np.eye(len(gamerules.TILE_DEFINITIONS), dtype=np.uint8)[terrain]
+        self.terrain_one_hot.flags.writeable = False
+        self.game = game
+        self.game_bytes = game_bytes
+        if game_bytes is None:
+            try:
+                self.game_bytes = pickle.dumps(game, protocol=pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                # unpicklable games are cloned with deepcopy and cannot be persisted
+                self.game_bytes = None
+
+    def clone(self):
+        """ Fresh game with the cached map, unpickling is cheaper than generating the terrain again."""
+        if self.game_bytes is not None:
+            return pickle.loads(self.game_bytes)
+        return copy.deepcopy(self.game)
+
+
+class MapCache(object):
+    """ Bounded LRU cache of generated maps keyed by (seed, height, width, min_forests, min_mountains).
+
+    With a directory, maps are also persisted as .npz files (terrain plus the pickled game) so that worker processes
+    and later runs skip generation too. Maps without a seed are random and never cached, maxsize=0 disables caching.
+    """
+
+    def __init__(self, maxsize=32, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def new_game(self, seed, height=None, width=None, min_forests=None, min_mountains=None):
+        """ Fresh main.Game for the map parameters with its (W, H) terrain and terrain one-hot arrays.
+
+        None parameters are left to main.Game's defaults. The terrain arrays are shared and read-only.
+        """
+        game_kwargs = {name: value for name, value in (('height', height), ('width', width),
+                                                       ('min_forests', min_forests), ('min_mountains', min_mountains))
+                       if value is not None}
+        if seed is None or self.maxsize == 0:
+            game = main.Game(seed=seed, **game_kwargs)
+            terrain = utils.tile_indices(game)
+            return game, terrain, np.eye(len(gamerules.TILE_DEFINITIONS), dtype=np.uint8)[terrain]
+        key = (seed, height, width, min_forests, min_mountains)
+        cached = self.entries.get(key)
+        if cached is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        else:
+            self.misses += 1
+            cached = self._load(key)
+            if cached is None:
+                cached = CachedMap(game=main.Game(seed=seed, **game_kwargs))
+                self._save(key, cached)
+            self.entries[key] = cached
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return cached.clone(), cached.terrain, cached.terrain_one_hot
+
+    def clear(self):
+        self.entries.clear()
+
+    def _path(self, key):
+        return os.path.join(self.directory, "map-%s.npz" % "-".join(str(part) for part in key))
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return CachedMap(terrain=data["terrain"], game_bytes=data["game"].tobytes())
+
+    def _save(self, key, cached):
+        if self.directory is None or cached.game_bytes is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        temporary_path = "%s.%d.tmp.npz" % (path[:-len(".npz")], os.getpid())
+        np.savez(temporary_path, terrain=cached.terrain, game=np.frombuffer(cached.game_bytes, dtype=np.uint8))
+        # other workers may be writing the same map, the rename keeps readers from seeing partial files
+        os.replace(temporary_path, path)
+
+
+DEFAULT_MAP_CACHE = MapCache()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from gym_alphaexpansion import utils
+from gym_alphaexpansion.map_cache import MapCache
+
+
+class MapCacheTest(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = MapCache(maxsize=4)
+        game, terrain, terrain_one_hot = cache.new_game(0)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        clone, cached_terrain, cached_one_hot = cache.new_game(0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertIsNot(clone, game)
+        self.assertIs(cached_terrain, terrain)
+        self.assertIs(cached_one_hot, terrain_one_hot)
+        np.testing.assert_array_equal(utils.tile_indices(clone), terrain)
+        self.assertFalse(terrain.flags.writeable)
+        cache.new_game(0, min_forests=3)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_clones_are_independent(self):
+        cache = MapCache(maxsize=1)
+        game, _, _ = cache.new_game(0)
+        game.proceedTick()
+        clone, _, _ = cache.new_game(0)
+        self.assertNotEqual(clone.tick, game.tick)
+
+    def test_lru_eviction(self):
+        cache = MapCache(maxsize=2)
+        cache.new_game(0)
+        cache.new_game(1)
+        cache.new_game(0)
+        cache.new_game(2)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual([key[0] for key in cache.entries], [0, 2])
+        cache.new_game(1)
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+        self.assertEqual([key[0] for key in cache.entries], [2, 1])
+
+    def test_unseeded_maps_are_not_cached(self):
+        cache = MapCache(maxsize=2)
+        cache.new_game(None)
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+
+    def test_maxsize_zero(self):
+        cache = MapCache(maxsize=0)
+        game, terrain, terrain_one_hot = cache.new_game(0)
+        other, other_terrain, _ = cache.new_game(0)
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+        self.assertIsNot(other, game)
+        np.testing.assert_array_equal(other_terrain, terrain)
+        np.testing.assert_array_equal(terrain_one_hot.argmax(axis=-1), terrain)
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = MapCache(directory=directory)
+            game, terrain, terrain_one_hot = cache.new_game(0)
+            self.assertEqual(os.listdir(directory), ["map-0-None-None-None-None.npz"])
+
+            reloaded = MapCache(directory=directory)
+            clone, loaded_terrain, loaded_one_hot = reloaded.new_game(0)
+            self.assertEqual((reloaded.hits, reloaded.misses), (0, 1))
+            self.assertIsNone(next(iter(reloaded.entries.values())).game)
+            np.testing.assert_array_equal(loaded_terrain, terrain)
+            np.testing.assert_array_equal(loaded_one_hot, terrain_one_hot)
+            np.testing.assert_array_equal(utils.tile_indices(clone), terrain)
+            self.assertEqual(clone.tick, game.tick)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import numpy as np
+from alphaexpansion import gamerules
+
+
+def sample_masked(action_space, mask, np_random=None):
+    """ Uniformly samples a Discrete or MultiDiscrete action out of the ones set in a flat boolean mask."""
+    valid = np.flatnonzero(mask)
+    if not len(valid):
+        return action_space.sample()
+    action = (np_random or np.random).choice(valid)
+    if hasattr(action_space, 'nvec'):
+        return np.asarray(np.unravel_index(action, action_space.nvec))
+    return action
+
+
+def building_tile_compatibility():
+    """ (n_tiles, n_buildings) table of which building may be placed on which tile type."""
+    tile_flags = 1 << np.arange(len(gamerules.TILE_DEFINITIONS))
+    building_tiles = np.asarray([definition['tile'] for definition in gamerules.BUILDING_DEFINITIONS])
+    return (tile_flags[:, np.newaxis] & building_tiles[np.newaxis, :]) != 0
+
+
+class CanBuildMask(object):
+    """ can_build tensor for a map, built from static terrain compatibility, occupancy and affordability.
+
+    terrain is the (W, H) array of tile indices (log2 of the tile flag) as used for terrain_one_hot, occupied may be
+    shared with a utils.MapSnapshot so occupancy does not have to be maintained twice.
+    """
+
+    def __init__(self, terrain, occupied=None):
+        self.static = building_tile_compatibility()[terrain]
+        self.occupied = np.zeros(terrain.shape, dtype=bool) if occupied is None else occupied
+        self.affordable = np.zeros(len(gamerules.BUILDING_DEFINITIONS), dtype=bool)
+
+    def update_affordable(self, game):
+        for building_id in range(len(self.affordable)):
+            self.affordable[building_id] = gamerules.isAffordable(building_id, 0, game)
+        return self.affordable
+
+    def compute(self, game, out=None):
+        """ Writes the (W, H, n_buildings) can_build tensor into out."""
+        if out is None:
+            out = np.zeros(self.static.shape, dtype=np.uint8)
+        np.logical_and(self.static, self.update_affordable(game), out=out)
+        out[self.occupied] = 0
+        return out
+
+    def action_mask(self, can_build, building=None, can_upgrade=None, out=None):
+        """ (n_buildings + 1, W, H) boolean mask laid out like the MultiDiscrete action space.
+
+        Building b at (x, y) is allowed where can_build is set, or where b already stands and can_upgrade is set when
+        the building id and can_upgrade planes are given. Right click (index 0) is allowed on occupied tiles.
+        """
+        if out is None:
+            out = np.zeros((can_build.shape[2] + 1,) + can_build.shape[:2], dtype=bool)
+        out[0] = self.occupied
+        np.not_equal(np.moveaxis(can_build, 2, 0), 0, out=out[1:])
+        if building is not None and can_upgrade is not None:
+            xs, ys = np.nonzero(self.occupied & (can_upgrade[:, :, 0] != 0))
+            out[building[xs, ys] + 1, xs, ys] = True
+        return out
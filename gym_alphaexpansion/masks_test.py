@@ -0,0 +1,44 @@
+import unittest
+
+import gym
+import numpy as np
+from alphaexpansion import gamerules
+
+from gym_alphaexpansion import masks
+
+
+class BuildingTileCompatibilityTest(unittest.TestCase):
+    def test_matches_building_tile_flags(self):
+        table = masks.building_tile_compatibility()
+        self.assertEqual(table.shape, (len(gamerules.TILE_DEFINITIONS), len(gamerules.BUILDING_DEFINITIONS)))
+        self.assertEqual(table.dtype, bool)
+        for building, definition in enumerate(gamerules.BUILDING_DEFINITIONS):
+            for tile in range(len(gamerules.TILE_DEFINITIONS)):
+                self.assertEqual(table[tile, building], bool(definition['tile'] & (1 << tile)), (tile, building))
+
+
+class SampleMaskedTest(unittest.TestCase):
+    def test_discrete_samples_only_valid_actions(self):
+        space = gym.spaces.Discrete(10)
+        mask = np.zeros(10, dtype=bool)
+        mask[[2, 7]] = True
+        rng = np.random.RandomState(0)
+        samples = {int(masks.sample_masked(space, mask, rng)) for _ in range(100)}
+        self.assertEqual(samples, {2, 7})
+
+    def test_multi_discrete_unravels_the_flat_mask(self):
+        space = gym.spaces.MultiDiscrete([3, 4, 5])
+        mask = np.zeros((3, 4, 5), dtype=bool)
+        mask[1, 2, 3] = True
+        mask[2, 0, 4] = True
+        rng = np.random.RandomState(0)
+        samples = {tuple(masks.sample_masked(space, mask.reshape(-1), rng)) for _ in range(100)}
+        self.assertEqual(samples, {(1, 2, 3), (2, 0, 4)})
+
+    def test_empty_mask_falls_back_to_the_space(self):
+        space = gym.spaces.Discrete(4)
+        self.assertTrue(space.contains(masks.sample_masked(space, np.zeros(4, dtype=bool))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import gym
+import numpy as np
+from alphaexpansion import gamerules
+
+from gym_alphaexpansion import masks, utils
+
+
+def allocate_observation(observation_space):
+    """ Zeroed arrays matching every Box in a Dict observation space."""
+    return {key: np.zeros(space.shape, dtype=space.dtype) for key, space in observation_space.spaces.items()}
+
+
+# 0/1 planes stored as packbits of the flattened plane in the packed encoding
+PACKED_KEYS = ('terrain', 'buildings', 'can_upgrade', 'can_build')
+
+
+def packed_observation_space(observation_space):
+    """ Observation space of pack_observation() for a dense AlphaExpansionEnv observation space.
+
+    The 0/1 planes become flat uint8 arrays of packed bits and relative_income a single value per resource, the
+    float planes are kept as they are.
+    """
+    spaces = dict(observation_space.spaces)
+    for key in PACKED_KEYS:
+        spaces[key] = gym.spaces.Box(low=0, high=255, shape=(-(-int(np.prod(spaces[key].shape)) // 8),),
+                                     dtype=np.uint8)
+    income = spaces["relative_income"]
+    spaces["relative_income"] = gym.spaces.Box(low=-1, high=1, shape=income.shape[-1:], dtype=income.dtype)
+    return gym.spaces.Dict(spaces)
+
+
+def pack_observation(observation):
+    """ Packed copy of a dense observation, see packed_observation_space()."""
+    packed = {key: plane.copy() for key, plane in observation.items() if key not in PACKED_KEYS}
+    for key in PACKED_KEYS:
+        packed[key] = np.packbits(observation[key].reshape(-1))
+    # income is the same for every space
+    packed["relative_income"] = observation["relative_income"][0, 0].copy()
+    return packed
+
+
+def unpack_observation(packed, observation_space):
+    """ Dense observation of a packed one, observation_space is the dense space it was packed from."""
+    spaces = observation_space.spaces
+    dense = {key: value for key, value in packed.items() if key not in PACKED_KEYS}
+    for key in PACKED_KEYS:
+        size = int(np.prod(spaces[key].shape))
+        dense[key] = np.unpackbits(packed[key], count=size).reshape(spaces[key].shape).astype(spaces[key].dtype)
+    income = spaces["relative_income"]
+    dense["relative_income"] = np.broadcast_to(packed["relative_income"], income.shape).astype(income.dtype)
+    return dense
+
+
+class ObservationState(object):
+    """ Persistent observation planes for AlphaExpansionEnv.
+
+    The buildings plane is only refreshed for tiles the map snapshot reports as changed, the other planes (income,
+    level normalization, upgrade affordability, efficiencies) are recomputed with vectorized ops from its arrays.
+    """
+
+    def __init__(self, width, height, buffers):
+        self.width = width
+        self.height = height
+        self.relative_income = buffers["relative_income"]
+        self.terrain = buffers["terrain"]
+        self.buildings = buffers["buildings"]
+        self.building_levels = buffers["building_levels"]
+        self.building_efficiencies = buffers["building_efficiencies"]
+        self.can_upgrade = buffers["can_upgrade"]
+        self.can_build = buffers["can_build"]
+        self.map_snapshot = None
+        self.bal_diff = np.zeros(self.relative_income.shape[-1], dtype=np.float64)
+        self.income = np.zeros(self.relative_income.shape[-1], dtype=np.float64)
+
+    def observation(self):
+        return {"relative_income": self.relative_income,
+                "terrain": self.terrain,
+                "buildings": self.buildings,
+                "building_levels": self.building_levels,
+                "building_efficiencies": self.building_efficiencies,
+                "can_upgrade": self.can_upgrade,
+                "can_build": self.can_build}
+
+    def reset(self, map_snapshot, terrain_one_hot):
+        self.map_snapshot = map_snapshot
+        self.game = map_snapshot.game
+        self.terrain[...] = terrain_one_hot
+        self.can_build_mask = masks.CanBuildMask(map_snapshot.tile, occupied=map_snapshot.occupied)
+        self.map_snapshot.changed = None
+        self.update()
+
+    def update(self, income=True):
+        """ Refreshes the planes, income can be left to the caller when it is computed for a whole batch."""
+        changed = self.map_snapshot.consume_changes()
+        if changed is None:
+            self._rebuild_buildings()
+        else:
+            for x, y in changed:
+                self.buildings[x, y] = 0
+                building = self.map_snapshot.building[x, y]
+                if building >= 0:
+                    self.buildings[x, y, building] = 1
+        self.building_efficiencies[:, :, 0] = self.map_snapshot.efficiency
+        if income:
+            self._update_income()
+        self._update_levels()
+        self._update_can_build()
+
+    def _rebuild_buildings(self):
+        self.buildings.fill(0)
+        xs, ys = np.nonzero(self.map_snapshot.occupied)
+        self.buildings[xs, ys, self.map_snapshot.building[xs, ys]] = 1
+
+    def _update_income(self):
+        utils.relative_income(utils.bal_diff_array(self.game, out=self.bal_diff), out=self.income)
+        self.relative_income[...] = self.income
+
+    def _update_levels(self):
+        self.building_levels.fill(0)
+        self.can_upgrade.fill(0)
+        occupied = self.map_snapshot.occupied
+        if not occupied.any():
+            return
+        ids = self.map_snapshot.building[occupied]
+        levels = self.map_snapshot.level[occupied]
+        # levels are relative to the max level of that building type currently out on the field
+        max_levels = np.zeros(len(gamerules.BUILDING_DEFINITIONS), dtype=levels.dtype)
+        np.maximum.at(max_levels, ids, levels)
+        max_levels = max_levels[ids]
+        self.building_levels[occupied, 0] = np.where(max_levels > 0, levels / np.maximum(max_levels, 1), 1)
+        # affordability only depends on (building, level), so evaluate it once per distinct pair
+        pairs, inverse = np.unique(np.stack((ids, levels)), axis=1, return_inverse=True)
+        affordable = np.fromiter(
+            (gamerules.isAffordable(int(build), int(level) + 1, self.game) for build, level in pairs.T),
+            dtype=np.uint8, count=pairs.shape[1])
+        self.can_upgrade[occupied, 0] = affordable[inverse.reshape(-1)]
+
+    def _update_can_build(self):
+        self.can_build_mask.compute(self.game, out=self.can_build)
@@ -0,0 +1,57 @@
+import unittest
+
+import gym
+import numpy as np
+
+from gym_alphaexpansion import observation
+
+
+def dense_space(width=5, height=4, tiles=3, buildings=6, resources=4):
+    def box(channels, dtype, low=0, high=1):
+        return gym.spaces.Box(low=low, high=high, shape=(width, height, channels), dtype=dtype)
+    return gym.spaces.Dict({"relative_income": box(resources, np.float32, low=-1),
+                            "terrain": box(tiles, np.uint8),
+                            "buildings": box(buildings, np.uint8),
+                            "building_levels": box(1, np.float32),
+                            "building_efficiencies": box(1, np.float32, high=np.inf),
+                            "can_upgrade": box(1, np.uint8),
+                            "can_build": box(buildings, np.uint8)})
+
+
+class PackedObservationTest(unittest.TestCase):
+    def test_round_trip(self):
+        space = dense_space()
+        rng = np.random.RandomState(0)
+        dense = {}
+        for key, subspace in space.spaces.items():
+            if subspace.dtype == np.uint8:
+                dense[key] = rng.randint(0, 2, subspace.shape).astype(np.uint8)
+            else:
+                dense[key] = rng.rand(*subspace.shape).astype(np.float32)
+        dense["relative_income"][...] = rng.uniform(-1, 1, space.spaces["relative_income"].shape[-1])
+
+        packed = observation.pack_observation(dense)
+        packed_space = observation.packed_observation_space(space)
+        self.assertEqual(set(packed), set(packed_space.spaces))
+        for key, value in packed.items():
+            self.assertEqual(value.shape, packed_space.spaces[key].shape, key)
+            self.assertEqual(value.dtype, packed_space.spaces[key].dtype, key)
+            self.assertTrue(packed_space.spaces[key].contains(value), key)
+
+        unpacked = observation.unpack_observation(packed, space)
+        for key, value in dense.items():
+            self.assertEqual(unpacked[key].dtype, value.dtype, key)
+            np.testing.assert_array_equal(unpacked[key], value, key)
+
+    def test_packing_does_not_alias_the_planes(self):
+        space = dense_space()
+        dense = observation.allocate_observation(space)
+        packed = observation.pack_observation(dense)
+        dense["building_levels"][...] = 1
+        dense["relative_income"][...] = 1
+        self.assertFalse(packed["building_levels"].any())
+        self.assertFalse(packed["relative_income"].any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import time
+
+PHASES = ('action', 'tick', 'reward', 'observation', 'info')
+
+
+class StepProfiler(object):
+    """ Cumulative and last-step wall time of every phase of step(), in nanoseconds, plus step counters."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.total_ns = dict.fromkeys(PHASES, 0)
+        self.last_ns = dict.fromkeys(PHASES, 0)
+        self.steps = 0
+        self.useless_actions = 0
+        self._mark = 0
+
+    def start(self):
+        self.steps += 1
+        self._mark = time.perf_counter_ns()
+
+    def lap(self, phase):
+        now = time.perf_counter_ns()
+        elapsed = now - self._mark
+        self.last_ns[phase] = elapsed
+        self.total_ns[phase] += elapsed
+        self._mark = now
+
+    def stats(self):
+        return {"steps": self.steps,
+                "useless_actions": self.useless_actions,
+                "phase_ns_total": dict(self.total_ns),
+                "phase_ns_last": dict(self.last_ns)}
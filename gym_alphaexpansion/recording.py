@@ -0,0 +1,204 @@
+import glob
+import os
+import re
+import queue
+import threading
+
+import gym
+import numpy as np
+
+# columns are first, action, reward, done, balance and the observation planes, rows are either a reset (first=True, no
+# action or reward) or a step, with the observation that call returned
+OBSERVATION = 'observation'
+# temporary files start with a dot so that they never match the shard pattern
+SHARD_PATTERN = "shard-[0-9][0-9][0-9][0-9][0-9][0-9].npz"
+
+
+def shard_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, SHARD_PATTERN)))
+
+
+def _next_shard_index(directory):
+    indices = [int(re.search(r"shard-(\d+)\.npz$", path).group(1)) for path in shard_paths(directory)]
+    return max(indices) + 1 if indices else 0
+
+
+def _balance(game):
+    balance = game.balance.values() if hasattr(game.balance, 'values') else game.balance
+    return np.fromiter(balance, dtype=np.float64, count=len(game.balance))
+
+
+def _observation_columns(observation):
+    if isinstance(observation, dict):
+        return {OBSERVATION + '_' + key: np.asarray(plane) for key, plane in observation.items()}
+    return {OBSERVATION: np.asarray(observation)}
+
+
+def delta_encode(rows):
+    """ XOR of the bytes of every row with the previous row, the first row is kept as is.
+
+    Consecutive observations mostly share their bytes, so the deltas are mostly zeros and compress well. The result has
+    the dtype and shape of rows, only its bytes are meaningful.
+    """
+    raw = np.ascontiguousarray(rows).reshape(len(rows), -1).view(np.uint8)
+    delta = raw.copy()
+    np.bitwise_xor(raw[1:], raw[:-1], out=delta[1:])
+    return delta.view(rows.dtype).reshape(rows.shape)
+
+
+def delta_decode(delta):
+    raw = np.bitwise_xor.accumulate(np.ascontiguousarray(delta).reshape(len(delta), -1).view(np.uint8), axis=0)
+    return raw.view(delta.dtype).reshape(delta.shape)
+
+
+class _ShardWriter(threading.Thread):
+    """ Delta encodes and compresses full chunks off the stepping thread."""
+
+    def __init__(self, directory):
+        super().__init__(daemon=True)
+        self.directory = directory
+        self.index = _next_shard_index(directory)
+        self.chunks = queue.Queue(maxsize=2)
+        self.error = None
+
+    def run(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self._write(chunk)
+            except Exception as e:  # reraised by the recorder on its next flush
+                self.error = e
+
+    def _write(self, columns):
+        arrays = {name: (delta_encode(column) if name.startswith(OBSERVATION) else column)
+                  for name, column in columns.items()}
+        temporary_path = os.path.join(self.directory, ".shard-%d-%d.npz.tmp" % (os.getpid(), threading.get_ident()))
+        with open(temporary_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        try:
+            # readers never see partial shards, and linking fails instead of overwriting a shard another recorder in
+            # the same directory took in the meantime
+            while True:
+                try:
+                    os.link(temporary_path, os.path.join(self.directory, "shard-%06d.npz" % self.index))
+                    break
+                except FileExistsError:
+                    self.index = _next_shard_index(self.directory)
+            self.index += 1
+        finally:
+            os.unlink(temporary_path)
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    """ Records every reset() and step() of an env into compressed shard-NNNNNN.npz files of chunk_size rows.
+
+    Rows are copied into preallocated column buffers, the delta encoding and compression of full chunks happens on a
+    background thread. Call close() (or flush()) to write the last, partial chunk. Read with TrajectoryReader.
+    """
+
+    def __init__(self, env, directory, chunk_size=1000):
+        super().__init__(env)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+        self.columns = None
+        self.rows = 0
+        self.writer = _ShardWriter(directory)
+        self.writer.start()
+
+    def reset(self, **kwargs):
+        observation = self.env.reset(**kwargs)
+        self._record(observation, True, None, 0.0, False)
+        return observation
+
+    def step(self, action):
+        observation, reward, done, info = self.env.step(action)
+        self._record(observation, False, action, reward, done)
+        return observation, reward, done, info
+
+    def _record(self, observation, first, action, reward, done):
+        observations = _observation_columns(observation)
+        action = np.zeros(self.action_space.shape, dtype=self.action_space.dtype) if action is None else action
+        balance = _balance(self.env.unwrapped.game)
+        if self.columns is None:
+            self.columns = self._allocate(observations, np.asarray(action), balance)
+        row = self.rows
+        columns = self.columns
+        columns['first'][row] = first
+        columns['action'][row] = action
+        columns['reward'][row] = reward
+        columns['done'][row] = done
+        columns['balance'][row] = balance
+        for name, plane in observations.items():
+            columns[name][row] = plane
+        self.rows += 1
+        if self.rows == self.chunk_size:
+            self.flush()
+
+    def _allocate(self, observations, action, balance):
+        columns = {'first': np.zeros(self.chunk_size, dtype=bool),
+                   'action': np.zeros((self.chunk_size,) + action.shape, dtype=action.dtype),
+                   'reward': np.zeros(self.chunk_size, dtype=np.float64),
+                   'done': np.zeros(self.chunk_size, dtype=bool),
+                   'balance': np.zeros((self.chunk_size,) + balance.shape, dtype=np.float64)}
+        for name, plane in observations.items():
+            columns[name] = np.zeros((self.chunk_size,) + plane.shape, dtype=plane.dtype)
+        return columns
+
+    def flush(self):
+        """ Hands the buffered rows to the writer thread, the writer owns them from here on."""
+        if self.writer.error is not None:
+            raise self.writer.error
+        if not self.rows:
+            return
+        self.writer.chunks.put({name: column[:self.rows] for name, column in self.columns.items()})
+        self.columns = None
+        self.rows = 0
+
+    def close(self):
+        if self.writer.is_alive():
+            self.flush()
+            self.writer.chunks.put(None)
+            self.writer.join()
+        if self.writer.error is not None:
+            raise self.writer.error
+        return self.env.close()
+
+
+class TrajectoryReader(object):
+    """ Sequence of the shards a TrajectoryRecorder wrote, shards are only loaded and decoded when accessed."""
+
+    def __init__(self, directory):
+        self.paths = shard_paths(directory)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        """ Dict of the decoded columns of shard index, observation planes keep their 'observation_' prefix."""
+        with np.load(self.paths[index]) as data:
+            return {name: (delta_decode(data[name]) if name.startswith(OBSERVATION)
+                           else data[name]) for name in data.files}
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def batches(self, batch_size):
+        """ Consecutive rows of all shards in batches of batch_size rows, the last batch may be smaller."""
+        pending = []
+        pending_rows = 0
+        for shard in self:
+            pending.append(shard)
+            pending_rows += len(shard['first'])
+            while pending_rows >= batch_size:
+                merged = {name: np.concatenate([part[name] for part in pending]) for name in pending[0]}
+                yield {name: column[:batch_size] for name, column in merged.items()}
+                pending = [{name: column[batch_size:] for name, column in merged.items()}]
+                pending_rows -= batch_size
+        if pending_rows:
+            yield {name: np.concatenate([part[name] for part in pending]) for name in pending[0]}
@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+
+from gym_alphaexpansion import recording
+
+
+class DeltaEncodingTest(unittest.TestCase):
+    def assert_round_trip(self, rows):
+        delta = recording.delta_encode(rows)
+        self.assertEqual(delta.dtype, rows.dtype)
+        self.assertEqual(delta.shape, rows.shape)
+        decoded = recording.delta_decode(delta)
+        self.assertEqual(decoded.dtype, rows.dtype)
+        np.testing.assert_array_equal(decoded, rows)
+
+    def test_uint8_planes(self):
+        rows = np.random.RandomState(0).randint(0, 2, (10, 5, 4, 3)).astype(np.uint8)
+        self.assert_round_trip(rows)
+
+    def test_float32_planes(self):
+        rows = np.random.RandomState(1).standard_normal((10, 5, 4, 1)).astype(np.float32)
+        rows[3] = np.inf
+        rows[4] = -0.0
+        self.assert_round_trip(rows)
+
+    def test_bool_planes(self):
+        self.assert_round_trip(np.random.RandomState(2).rand(10, 7) < 0.5)
+
+    def test_unchanged_rows_encode_to_zeros(self):
+        rows = np.repeat(np.random.RandomState(3).rand(1, 6).astype(np.float32), 4, axis=0)
+        delta = recording.delta_encode(rows)
+        np.testing.assert_array_equal(delta[0], rows[0])
+        self.assertFalse(delta[1:].view(np.uint8).any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import copy
+import random
+
+import numpy as np
+
+
+class GameState(object):
+    """ Restorable state of a main.Game, taken without copying the map, the display or the building objects.
+
+    Game attributes are copied one container level deep, buildings as their attribute dicts, map cells as references
+    and random generators as their internal state. It can only be restored into the game it was taken from.
+    """
+
+    __slots__ = ('game', 'attributes', 'map_attributes', 'cells', 'buildings', 'building_attributes', 'rng_states')
+
+    def __init__(self, game):
+        self.game = game
+        self.rng_states = {}
+        self.attributes = _copy_attributes(game, self.rng_states, skip=('map',))
+        self.map_attributes = _copy_attributes(game.map, self.rng_states, skip=('map',))
+        self.cells = [row[:] for row in game.map.map]
+        self.buildings = tuple(game.buildings)
+        self.building_attributes = [building.__dict__.copy() for building in self.buildings]
+
+    def restore(self, game):
+        if game is not self.game:
+            raise ValueError("a GameState can only be restored into the game it was taken from")
+        _restore_attributes(game, self.attributes)
+        _restore_attributes(game.map, self.map_attributes)
+        for row, cells in zip(game.map.map, self.cells):
+            row[:] = cells
+        for building, attributes in zip(self.buildings, self.building_attributes):
+            building.__dict__.update(attributes)
+        for (owner, name), rng_state in self.rng_states.items():
+            _set_rng_state(getattr(owner, name), rng_state)
+
+
+def reseed_rngs(owner, seed):
+    """ Seeds every random generator attribute of owner with seed, returns how many were seeded."""
+    seeded = 0
+    for name, value in list(owner.__dict__.items()):
+        if not _is_rng(value):
+            continue
+        if isinstance(value, np.random.Generator):
+            setattr(owner, name, np.random.Generator(type(value.bit_generator)(seed)))
+        else:
+            value.seed(seed)
+        seeded += 1
+    return seeded
+
+
+def _is_rng(value):
+    return isinstance(value, (random.Random, np.random.RandomState, np.random.Generator))
+
+
+def _get_rng_state(rng):
+    if isinstance(rng, np.random.Generator):
+        return copy.deepcopy(rng.bit_generator.state)
+    if isinstance(rng, np.random.RandomState):
+        return rng.get_state()
+    return rng.getstate()
+
+
+def _set_rng_state(rng, rng_state):
+    if isinstance(rng, np.random.Generator):
+        rng.bit_generator.state = rng_state
+    elif isinstance(rng, np.random.RandomState):
+        rng.set_state(rng_state)
+    else:
+        rng.setstate(rng_state)
+
+
+def _copy_attributes(owner, rng_states, skip=()):
+    attributes = {}
+    for name, value in owner.__dict__.items():
+        if name in skip:
+            continue
+        if _is_rng(value):
+            rng_states[(owner, name)] = _get_rng_state(value)
+        attributes[name] = _shallow_copy(value)
+    return attributes
+
+
+def _restore_attributes(owner, attributes):
+    for name, value in attributes.items():
+        setattr(owner, name, _shallow_copy(value))
+
+
+def _shallow_copy(value):
+    if isinstance(value, (dict, list, set)):
+        return copy.copy(value)
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    return value
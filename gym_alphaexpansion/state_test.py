@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+
+from gym_alphaexpansion import masks
+from gym_alphaexpansion.envs.alphaexpansion_env import AlphaExpansionEnv
+from gym_alphaexpansion.envs.alphaexpansionroad_env import AlphaExpansionRoadEnv
+
+
+def assert_observations_equal(a, b):
+    if isinstance(a, dict):
+        for key in a:
+            np.testing.assert_array_equal(a[key], b[key], key)
+    else:
+        np.testing.assert_array_equal(a, b)
+
+
+class GetSetStateTest(unittest.TestCase):
+    def check_round_trip(self, env, steps=30):
+        env.seed(0)
+        env.reset()
+        rng = np.random.RandomState(0)
+        for _ in range(steps):
+            observation, _, _, _ = env.step(masks.sample_masked(env.action_space, env.action_mask(), rng))
+        saved = env.get_state()
+
+        actions = []
+        played = []
+        for _ in range(steps):
+            actions.append(masks.sample_masked(env.action_space, env.action_mask(), rng))
+            next_observation, reward, done, _ = env.step(actions[-1])
+            played.append((next_observation, reward, done))
+
+        assert_observations_equal(env.set_state(saved), observation)
+        for action, (next_observation, reward, done) in zip(actions, played):
+            replayed_observation, replayed_reward, replayed_done, _ = env.step(action)
+            assert_observations_equal(replayed_observation, next_observation)
+            self.assertEqual(replayed_reward, reward)
+            self.assertEqual(replayed_done, done)
+
+    def test_alphaexpansion_env(self):
+        self.check_round_trip(AlphaExpansionEnv(render_mode=None))
+
+    def test_alphaexpansion_road_env(self):
+        self.check_round_trip(AlphaExpansionRoadEnv(render_mode=None))
+
+
+if __name__ == '__main__':
+    unittest.main()
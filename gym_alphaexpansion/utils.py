@@ -3,16 +3,59 @@ import operator
 from alphaexpansion import gamerules
 
 
-def negative_allowing_log_10(input):
-    mask = input < 0
-    output = np.clip(np.log10(np.abs(input)), 0, np.inf)
-    output[mask] = np.negative(output[mask])
-    return output
+def negative_allowing_log_10(input, out=None):
+    """ sign(x) * max(log10(|x|), 0) of every element, written into out (a new float64 array if None)."""
+    if out is None:
+        out = np.empty(np.shape(input), dtype=np.float64)
+    np.abs(input, out=out)
+    # clamping to 1 first is the same as clipping the log at 0, without the -inf of log10(0)
+    np.maximum(out, 1, out=out)
+    np.log10(out, out=out)
+    return np.copysign(out, input, out=out)
 
 
 def abs_max_scaling(input):
     abs_max = np.abs(input).max()
-    return np.divide(input, abs_max, where=abs_max != 0)
+    return np.divide(input, abs_max, out=np.zeros(np.shape(input)), where=abs_max != 0)
+
+
+def abs_max_scaling_rows(input, out=None, abs_max=None):
+    """ abs_max_scaling of every row (last axis) of input separately, rows that are all 0 stay 0.
+
+    out may be input itself, abs_max is an optional (..., 1) buffer for the row maxima.
+    """
+    abs_max = np.max(input, axis=-1, keepdims=True, out=abs_max)
+    np.maximum(abs_max, -np.min(input, axis=-1, keepdims=True), out=abs_max)
+    # rows that are all 0 are divided by 1 instead
+    abs_max[abs_max == 0] = 1
+    return np.divide(input, abs_max, out=out)
+
+
+def relative_income(bal_diff, out=None, abs_max=None):
+    """ Log scaled income of (..., n_resources) balDiff arrays relative to the largest abs income of each row."""
+    out = negative_allowing_log_10(bal_diff, out=out)
+    return abs_max_scaling_rows(out, out=out, abs_max=abs_max)
+
+
+def income_rewards(bal_diff, reward_columns, out=None):
+    """ Sum of the reward_columns columns (at least two) of an (N, n_resources) balDiff array.
+
+    This is balDiff[1] + balDiff[2] of AlphaExpansionEnv for a whole batch, with reward_columns the positions of
+    resources 1 and 2 in balDiff.
+    """
+    out = np.add(bal_diff[:, reward_columns[0]], bal_diff[:, reward_columns[1]], out=out)
+    for column in reward_columns[2:]:
+        np.add(out, bal_diff[:, column], out=out)
+    return out
+
+
+def bal_diff_array(game, out=None):
+    """ The values of game.balDiff in key order, written into out if given."""
+    values = np.fromiter(game.balDiff.values(), dtype=np.float64, count=len(game.balDiff))
+    if out is None:
+        return values
+    out[...] = values
+    return out
 
 
 def apply_f(a, f):
@@ -38,3 +81,84 @@ def apply_can_build(input, build, game):
 tile_getter = np.vectorize(apply_tile_getter)
 
 can_build = np.vectorize(apply_can_build)
+
+
+def tile_indices(game):
+    """ (W, H) array of the tile index (log2 of the tile flag) of every space."""
+    width = game.map.CHUNK_WIDTH
+    height = game.map.CHUNK_HEIGHT
+    tiles = np.fromiter((cell.tile for row in game.map.map for cell in row), dtype=np.int64, count=width * height)
+    return np.log2(tiles).astype(np.uint8).reshape(height, width).transpose().copy()
+
+
+class MapSnapshot(object):
+    """ Compact arrays mirrored from a game's map, indexed [x, y] like the AlphaExpansionEnv planes.
+
+    tile is the tile index (log2 of the tile flag), building the building id (-1 is no building), level and efficiency
+    the building's level and efficiency, occupied whether a building stands on the tile. The owner of the game calls
+    sync_tile() after every click and sync_tick() after every proceedTick(): clicks resync only the clicked tile, ticks
+    refresh the efficiency of all buildings. The game itself is left untouched, so it can still be copied and pickled.
+    A tile array that is already known, e.g. from a MapCache, can be passed in and is never written to.
+    """
+
+    def __init__(self, game, track_efficiency=True, tile=None):
+        self.game = game
+        self.width = game.map.CHUNK_WIDTH
+        self.height = game.map.CHUNK_HEIGHT
+        self.track_efficiency = track_efficiency
+        self.tile = tile_indices(game) if tile is None else tile
+        self.building = np.full((self.width, self.height), -1, dtype=np.int16)
+        self.level = np.zeros((self.width, self.height), dtype=np.int32)
+        self.efficiency = np.zeros((self.width, self.height), dtype=np.float32)
+        self.occupied = np.zeros((self.width, self.height), dtype=bool)
+        self.building_count = 0
+        # tiles changed since the last consume_changes(), None after a full sync
+        self.changed = set()
+        self.sync_all()
+
+    def consume_changes(self):
+        changed = self.changed
+        self.changed = set()
+        return changed
+
+    def sync_all(self):
+        self.building.fill(-1)
+        self.level.fill(0)
+        self.efficiency.fill(0)
+        self.occupied.fill(False)
+        self.building_count = 0
+        for building in self.game.buildings:
+            self._set_building(building.x, building.y, building)
+        self.changed = None
+
+    def sync_tile(self, x, y):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return
+        if self.occupied[x, y]:
+            self.building[x, y] = -1
+            self.level[x, y] = 0
+            self.efficiency[x, y] = 0
+            self.occupied[x, y] = False
+            self.building_count -= 1
+        cell = self.game.map.map[y][x]
+        if hasattr(cell, 'build'):
+            self._set_building(x, y, cell)
+        if self.changed is not None:
+            self.changed.add((x, y))
+
+    def sync_tick(self):
+        """ Resyncs after a tick. Building ids and levels only change with the clicked tiles, but efficiency is
+        refreshed for every building on every tick, O(buildings), as the game may change it for any building."""
+        if self.building_count != len(self.game.buildings):
+            # something other than a click changed the map
+            self.sync_all()
+        elif self.track_efficiency:
+            for building in self.game.buildings:
+                self.efficiency[building.x, building.y] = building.eff
+
+    def _set_building(self, x, y, building):
+        self.building[x, y] = building.build
+        self.level[x, y] = building.level
+        self.efficiency[x, y] = building.eff if self.track_efficiency else 0
+        self.occupied[x, y] = True
+        self.building_count += 1
@@ -1,8 +1,63 @@
+import copy
+import pickle
 import unittest
 import gym_alphaexpansion.utils as utils
 import numpy as np
 
 
+class FakeSpace(object):
+    def __init__(self, tile):
+        self.tile = tile
+
+
+class FakeBuilding(FakeSpace):
+    def __init__(self, x, y, tile, build):
+        super().__init__(tile)
+        self.x = x
+        self.y = y
+        self.build = build
+        self.level = 0
+        self.eff = 1.0
+
+
+class FakeMap(object):
+    CHUNK_WIDTH = 4
+    CHUNK_HEIGHT = 3
+
+    def __init__(self):
+        self.map = [[FakeSpace(1 << ((x + y) % 3)) for x in range(self.CHUNK_WIDTH)] for y in range(self.CHUNK_HEIGHT)]
+
+
+class FakeGame(object):
+    """ The parts of main.Game that MapSnapshot reads, clicks replace a space with a building and back."""
+
+    def __init__(self):
+        self.map = FakeMap()
+        self.buildings = []
+
+    def gym_left_click(self, x, y, build):
+        space = self.map.map[y][x]
+        if hasattr(space, 'build'):
+            space.level += 1
+            return True
+        building = FakeBuilding(x, y, space.tile, build)
+        self.map.map[y][x] = building
+        self.buildings.append(building)
+        return True
+
+    def gym_right_click(self, x, y):
+        space = self.map.map[y][x]
+        if not hasattr(space, 'build'):
+            return False
+        self.buildings.remove(space)
+        self.map.map[y][x] = FakeSpace(space.tile)
+        return True
+
+    def proceedTick(self):
+        for building in self.buildings:
+            building.eff /= 2
+
+
 class UtilsTest(unittest.TestCase):
     def test_negative_allowing_log_10(self):
         #self.assertEquals(utils.negative_allowing_log_10(np.asarray([10, -10, 10, -20])))
@@ -10,6 +65,82 @@ class UtilsTest(unittest.TestCase):
         print(utils.abs_max_scaling(utils.negative_allowing_log_10(np.asarray([0, 0, 0, 0, 0]))))
         print(utils.abs_max_scaling(utils.negative_allowing_log_10(np.asarray([-8.0, 0.0, 1.0, 0, 0, 0, 0.0, 0, 0, 0, 0, 0, 0, 0, 0, 0]))))
 
+    def test_abs_max_scaling_of_zeros(self):
+        np.testing.assert_array_equal(utils.abs_max_scaling(np.zeros(4)), np.zeros(4))
+
+    def test_relative_income_rows(self):
+        bal_diff = np.asarray([[10, -10, 9999999, -20, 0], [0, 0, 0, 0, 0], [-8.0, 0.5, -0.5, 1.0, 100.0]])
+        out = np.full(bal_diff.shape, np.nan)
+        abs_max = np.full((3, 1), np.nan)
+        result = utils.relative_income(bal_diff, out=out, abs_max=abs_max)
+        self.assertIs(result, out)
+        for row, expected in zip(out, bal_diff):
+            np.testing.assert_allclose(row, utils.abs_max_scaling(utils.negative_allowing_log_10(expected)))
+        np.testing.assert_array_equal(out[1], np.zeros(5))
+        np.testing.assert_allclose(out[0], [1 / 7, -1 / 7, 1, -np.log10(20) / 7, 0])
+
+    def test_income_rewards(self):
+        bal_diff = np.arange(12, dtype=np.float64).reshape(3, 4)
+        out = np.zeros(3)
+        utils.income_rewards(bal_diff, [1, 3], out=out)
+        np.testing.assert_array_equal(out, bal_diff[:, 1] + bal_diff[:, 3])
+
+
+class MapSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.game = FakeGame()
+        self.snapshot = utils.MapSnapshot(self.game)
+        self.assertIsNone(self.snapshot.consume_changes())
+
+    def test_tiles(self):
+        np.testing.assert_array_equal(self.snapshot.tile, [[(x + y) % 3 for y in range(3)] for x in range(4)])
+
+    def test_sync_after_left_click(self):
+        self.game.gym_left_click(2, 1, 5)
+        self.snapshot.sync_tile(2, 1)
+        self.assertEqual(self.snapshot.consume_changes(), {(2, 1)})
+        self.assertEqual(self.snapshot.building_count, 1)
+        self.assertTrue(self.snapshot.occupied[2, 1])
+        self.assertEqual(self.snapshot.building[2, 1], 5)
+        self.assertEqual(self.snapshot.efficiency[2, 1], 1.0)
+        self.assertEqual(np.count_nonzero(self.snapshot.occupied), 1)
+        # clicking a building upgrades it
+        self.game.gym_left_click(2, 1, 5)
+        self.snapshot.sync_tile(2, 1)
+        self.assertEqual(self.snapshot.level[2, 1], 1)
+        self.assertEqual(self.snapshot.building_count, 1)
+
+    def test_sync_after_right_click(self):
+        self.game.gym_left_click(0, 0, 3)
+        self.snapshot.sync_tile(0, 0)
+        self.game.gym_right_click(0, 0)
+        self.snapshot.sync_tile(0, 0)
+        self.assertEqual(self.snapshot.building_count, 0)
+        self.assertFalse(self.snapshot.occupied.any())
+        self.assertEqual(self.snapshot.building[0, 0], -1)
+
+    def test_sync_after_tick(self):
+        self.game.gym_left_click(1, 2, 4)
+        self.snapshot.sync_tile(1, 2)
+        self.game.proceedTick()
+        self.snapshot.sync_tick()
+        self.assertEqual(self.snapshot.efficiency[1, 2], 0.5)
+
+    def test_tick_resyncs_buildings_placed_without_a_sync(self):
+        self.snapshot.consume_changes()
+        self.game.gym_left_click(3, 0, 2)
+        self.game.proceedTick()
+        self.snapshot.sync_tick()
+        self.assertIsNone(self.snapshot.consume_changes())
+        self.assertEqual(self.snapshot.building[3, 0], 2)
+
+    def test_game_stays_copyable(self):
+        self.assertEqual(set(vars(self.game)), {'map', 'buildings'})
+        clone = copy.deepcopy(self.game)
+        clone.gym_left_click(0, 0, 1)
+        self.assertEqual(self.game.buildings, [])
+        pickle.dumps(self.game)
+
 
 if __name__ == '__main__':
     unittest.main()